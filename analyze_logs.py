@@ -0,0 +1,316 @@
+"""Streaming, resumable analyzer for logs/kalvium_attendance_*.log.
+
+Usage: python analyze_logs.py [--logs DIR] [--reset] [--json]
+
+Reads the day logs line by line, splits them into runs on the STARTING / "Browser
+closed" markers, and aggregates per-phase durations (timestamp deltas between phase
+markers), run outcomes and which fallback approach won. Byte offsets and the running
+aggregates are kept in a small state file, so a re-run only reads lines appended
+since the last one and memory stays constant however many logs accumulate.
+
+Day logs that rolled over are read from their gzipped parts (.log.N.gz, oldest
+first). Offsets are keyed by a hash of each part's first line rather than its name,
+so a file that is read half-way, then rotated and compressed, resumes where it left off.
+A run still open at the end of a file is kept per log (the day log, or a fleet
+account's _<account>.log), so it only continues in that log's later parts.
+"""
+import argparse
+import bisect
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+
+#######################################################
+# Analyzer configuration
+#######################################################
+DEFAULT_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+STATE_FILENAME = ".analyzer_state.json"
+LOG_PATTERN = "kalvium_attendance_*.log*"  # The live day log and its .log.N.gz parts
+MAX_MESSAGE_CHARS = 300  # OAuth URLs can be several KB; markers are all near the start
+RUN_IDLE_TIMEOUT = 600   # A run silent this long (crash, killed window) is closed at its last line
+
+RUN_START_MARKERS = ("STARTING KALVIUM ATTENDANCE SCRIPT", "====== WebDriver manager ======")
+RUN_END_MARKERS = ("Browser closed", "Closed attendance tab")
+# A --fast run that settles over HTTP returns before any browser is started or closed
+FAST_PATH_END_MARKERS = ("Fast path: already marked as present", "Fast path: attendance marked as present")
+
+# Message prefix -> phase that starts there (a phase ends where the next one starts)
+PHASE_MARKERS = [
+    ("Starting Chrome browser", "driver_startup"),
+    ("Attaching to warm browser", "driver_startup"),
+    ("Navigating to Kalvium Community", "navigation"),
+    ("Checking if already logged in", "check_if_logged_in"),
+    ("Looking for 'Continue with Google' button", "find_and_click_google_button"),
+    ("Checking for session feedback prompt", "handle_session_feedback_improved"),
+    ("Checking if user is already marked as present", "check_if_already_present"),
+    ("Waiting for the attendance window", "wait_for_attendance_window"),
+    ("Looking for 'Mark Attendance' button", "find_and_click_mark_attendance"),
+    ("Attempting to find and click Mark Attendance button", "find_and_click_mark_attendance"),
+    ("Waiting for camera to initialize", "handle_camera_and_present_button_fast"),
+    ("Verifying success", "verify_success"),
+]
+
+# Message prefix -> (phase, winning approach)
+WINNER_MARKERS = [
+    ("Clicked Google button using cached locator", ("google_button", "cached locator")),
+    ("Clicked attendance button using cached locator", ("mark_attendance", "cached locator")),
+    ("Clicked Google button using approach 1", ("google_button", "approach 1")),
+    ("Clicked Google button using approach 2", ("google_button", "approach 2")),
+    ("JavaScript approach succeeded", ("google_button", "approach 3")),
+    ("Clicked attendance button", ("mark_attendance", "direct XPath")),
+    ("JavaScript found and clicked attendance button", ("mark_attendance", "JavaScript fallback")),
+    ("Clicked Present button", ("present_button", "conventional XPath")),
+    ("Button clicking appears successful", ("present_button", "JavaScript retries")),
+]
+
+# Message fragment -> run outcome; later matches in a run override earlier ones
+OUTCOME_MARKERS = [
+    ("Script completed", "unverified"),
+    ("Attendance successfully marked", "present"),
+    ("already marked as present for today", "already_present"),
+    ("Fast path: attendance marked as present", "present"),
+]
+FAILURE_LEVELS = (" - ERROR - ",)
+
+# Histogram bucket upper bounds (seconds) for approximate percentiles in constant memory
+BUCKETS = [0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120, 300, float("inf")]
+#######################################################
+
+LOG_PART_RE = re.compile(r"(.*\.log)(?:\.(\d+)\.gz)?$")
+
+def parse_timestamp(line):
+    """'2025-04-18 09:06:28,095 - ...' -> datetime, or None for continuation lines"""
+    if len(line) < 23 or not line[:4].isdigit() or line[4] != "-":
+        return None
+    try:
+        return datetime(int(line[0:4]), int(line[5:7]), int(line[8:10]),
+                        int(line[11:13]), int(line[14:16]), int(line[17:19]), int(line[20:23]) * 1000)
+    except ValueError:
+        return None
+
+def new_totals():
+    return {"runs": 0, "outcomes": {}, "phases": {}, "winners": {}}
+
+def new_state():
+    return {"files": {}, "open_runs": {}, "totals": new_totals()}
+
+def base_log_name(path):
+    """kalvium_attendance_<date>[_<account>].log for the live log and its .log.N.gz parts"""
+    match = LOG_PART_RE.match(os.path.basename(path))
+    return match.group(1) if match else os.path.basename(path)
+
+class LogAnalyzer:
+    """Feeds log lines through a tiny run/phase state machine into running aggregates"""
+
+    def __init__(self, state):
+        self.state = state
+        self.totals = state["totals"]
+        self.log = None  # Base name of the log being fed; its open run is kept under it
+
+    # ---- aggregates -------------------------------------------------------
+
+    def _record_phase(self, phase, seconds):
+        stats = self.totals["phases"].setdefault(
+            phase, {"count": 0, "total": 0.0, "min": None, "max": 0.0, "histogram": [0] * len(BUCKETS)})
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["min"] = seconds if stats["min"] is None else min(stats["min"], seconds)
+        stats["max"] = max(stats["max"], seconds)
+        stats["histogram"][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def _close_phase(self, run, at):
+        if run["phase"]:
+            started = datetime.fromisoformat(run["phase_started"])
+            self._record_phase(run["phase"], max(0.0, (at - started).total_seconds()))
+        run["phase"] = None
+        run["phase_started"] = None
+
+    def _close_run(self, at, outcome=None):
+        run = self.state["open_runs"].get(self.log)
+        if run is None:
+            return
+        self._close_phase(run, at)
+        self._record_phase("end_to_end", max(0.0, (at - datetime.fromisoformat(run["started"])).total_seconds()))
+        outcome = outcome or run["outcome"] or ("failed" if run["errors"] else "incomplete")
+        self.totals["runs"] += 1
+        self.totals["outcomes"][outcome] = self.totals["outcomes"].get(outcome, 0) + 1
+        for key in run["winners"]:
+            self.totals["winners"][key] = self.totals["winners"].get(key, 0) + 1
+        del self.state["open_runs"][self.log]
+
+    # ---- line handling ----------------------------------------------------
+
+    def feed(self, line):
+        at = parse_timestamp(line)
+        if at is None:
+            return  # traceback / stack continuation line
+        message = line[23:23 + MAX_MESSAGE_CHARS]
+        run = self.state["open_runs"].get(self.log)
+        if run is not None and (at - datetime.fromisoformat(run["last_seen"])).total_seconds() > RUN_IDLE_TIMEOUT:
+            self._close_run(datetime.fromisoformat(run["last_seen"]), outcome=run["outcome"] or "incomplete")
+            run = None
+
+        if any(marker in message for marker in RUN_START_MARKERS):
+            # The old script logged "WebDriver manager" inside a run that already started
+            if run is not None and "WebDriver manager" in message and run["phase"] == "driver_startup":
+                return
+            self._close_run(at, outcome="incomplete" if run and not run["outcome"] else None)
+            self.state["open_runs"][self.log] = {"started": at.isoformat(), "last_seen": at.isoformat(), "phase": None,
+                                      "phase_started": None, "outcome": None, "errors": 0, "winners": []}
+            return
+        if run is None:
+            return
+        run["last_seen"] = at.isoformat()
+
+        if any(level in message for level in FAILURE_LEVELS):
+            run["errors"] += 1
+        for prefix, phase in PHASE_MARKERS:
+            if prefix in message:
+                if phase != run["phase"]:
+                    self._close_phase(run, at)
+                    run["phase"] = phase
+                    run["phase_started"] = at.isoformat()
+                break
+        for prefix, (phase, approach) in WINNER_MARKERS:
+            if prefix in message:
+                run["winners"].append(f"{phase}: {approach}")
+                break
+        for fragment, outcome in OUTCOME_MARKERS:
+            if fragment in message:
+                # A verified or already-present outcome is never downgraded to "unverified"
+                if not (outcome == "unverified" and run["outcome"] in ("present", "already_present")):
+                    run["outcome"] = outcome
+        if any(marker in message for marker in RUN_END_MARKERS + FAST_PATH_END_MARKERS):
+            self._close_run(at)
+
+    def process_file(self, path):
+        """Stream the part of path not seen yet; returns the number of (uncompressed) bytes read"""
+        compressed = path.endswith(".gz")
+        self.log = base_log_name(path)
+        try:
+            with open_log(path) as f:
+                first = f.readline()
+                if not first.endswith(b"\n"):
+                    return 0  # Empty, or its first line is still being written
+                key = "sha1:" + hashlib.sha1(first).hexdigest()
+                files = self.state["files"]
+                # State written before rotation support was keyed by file name
+                entry = files.setdefault(key, files.pop(os.path.basename(path), None) or {"offset": 0})
+                if entry.get("done"):
+                    return 0
+                if not compressed and os.path.getsize(path) < entry["offset"]:
+                    entry["offset"] = 0  # File was truncated or replaced - start over
+                offset = start = entry["offset"]
+                f.seek(offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # Partial line still being written - pick it up next time
+                    offset += len(raw)
+                    entry["offset"] = offset
+                    self.feed(raw.decode("utf-8", errors="replace"))
+                else:
+                    # Compressed parts never change again
+                    entry["done"] = compressed
+        except (EOFError, OSError):
+            return 0  # A part still being compressed - the next run reads the rest
+        return offset - start
+
+def open_log(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def log_parts(log_dir):
+    """Day logs and their rotated parts, oldest first (.log.3.gz, .log.2.gz, .log.1.gz, .log)"""
+    def order(path):
+        match = LOG_PART_RE.match(os.path.basename(path))
+        return (match.group(1), -int(match.group(2) or 0)) if match else (path, 0)
+    paths = [path for path in glob.glob(os.path.join(log_dir, LOG_PATTERN))
+             if path.endswith(".log") or path.endswith(".gz")]
+    return sorted(paths, key=order)
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return new_state()
+    # State written before open runs were kept per log: that run's log is unknown
+    state.pop("open_run", None)
+    state.setdefault("open_runs", {})
+    return state
+
+def save_state(path, state):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+def approximate_percentile(histogram, fraction):
+    total = sum(histogram)
+    if not total:
+        return None
+    running = 0
+    for bound, count in zip(BUCKETS, histogram):
+        running += count
+        if running >= fraction * total:
+            return bound
+    return BUCKETS[-1]
+
+def summary(totals):
+    """Report dict: outcome rates, per-phase duration stats and fallback winners"""
+    runs = totals["runs"]
+    flow_order = list(dict.fromkeys(phase for _, phase in PHASE_MARKERS)) + ["end_to_end"]
+    phases = {}
+    for phase, stats in sorted(totals["phases"].items(),
+                               key=lambda item: flow_order.index(item[0]) if item[0] in flow_order else 0):
+        phases[phase] = {
+            "count": stats["count"],
+            "mean_s": round(stats["total"] / stats["count"], 2),
+            "p50_s": approximate_percentile(stats["histogram"], 0.50),
+            "p95_s": approximate_percentile(stats["histogram"], 0.95),
+            "min_s": round(stats["min"], 2),
+            "max_s": round(stats["max"], 2),
+        }
+    return {
+        "runs": runs,
+        "outcomes": {outcome: {"count": count, "rate": round(count / runs, 3)}
+                     for outcome, count in sorted(totals["outcomes"].items())} if runs else {},
+        "phases": phases,
+        "winners": dict(sorted(totals["winners"].items())),
+    }
+
+def format_summary(report):
+    lines = [f"Runs analyzed: {report['runs']}", "", "Outcomes:"]
+    for outcome, data in report["outcomes"].items():
+        lines.append(f"  {outcome:<20} {data['count']:>5}  {data['rate'] * 100:5.1f}%")
+    lines += ["", f"  {'phase':<40} {'n':>5} {'mean s':>8} {'~p50 s':>8} {'~p95 s':>8} {'max s':>8}"]
+    for phase, stats in report["phases"].items():
+        lines.append(f"  {phase:<40} {stats['count']:>5} {stats['mean_s']:>8} {stats['p50_s']:>8} "
+                     f"{stats['p95_s']:>8} {stats['max_s']:>8}")
+    lines += ["", "Winning approaches:"]
+    for key, count in report["winners"].items():
+        lines.append(f"  {key:<45} {count:>5}")
+    return "\n".join(lines)
+
+def analyze(log_dir, reset=False):
+    """Process new log lines in log_dir, persist state, and return the summary report"""
+    state_path = os.path.join(log_dir, STATE_FILENAME)
+    state = new_state() if reset else load_state(state_path)
+    analyzer = LogAnalyzer(state)
+    for path in log_parts(log_dir):
+        analyzer.process_file(path)
+    save_state(state_path, state)
+    return summary(state["totals"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze kalvium_attendance_*.log files incrementally")
+    parser.add_argument("--logs", default=DEFAULT_LOG_DIR, help="directory with the day logs")
+    parser.add_argument("--reset", action="store_true", help="forget saved offsets and re-read everything")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = analyze(args.logs, reset=args.reset)
+    print(json.dumps(report, indent=2) if args.json else format_summary(report))
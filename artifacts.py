@@ -0,0 +1,293 @@
+"""Content-addressed store for screenshots and other debug artifacts.
+
+Usage: python artifacts.py compact [--logs DIR]   # move loose logs/*.png etc. into the store
+       python artifacts.py prune                  # apply the retention budget now
+       python artifacts.py stats
+       python artifacts.py diff OLD NEW           # compare two text snapshots
+
+Every capture is hashed (sha256) and written once to logs/artifacts/blobs/<ab>/<hash>.<ext>;
+an identical capture later (the same login page, run after run) only adds a line to
+logs/artifacts/manifest.jsonl, which maps (run, stage, time) to its blob. Retention
+drops manifest entries older than ARTIFACT_MAX_AGE_DAYS, then the oldest entries until
+the blobs still referenced fit in ARTIFACT_MAX_BYTES, and deletes unreferenced blobs.
+Fleet workers share one store, so writes and retention hold logs/artifacts/store.lock.
+
+Text snapshots (.json.gz: visible texts, buttons with labels/classes/boxes, URL and
+title) can be diffed; OLD and NEW are blob paths or <run>:<stage> references, where
+<run> may be a prefix of a run id and the latest matching capture is used.
+"""
+import argparse
+import collections
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+#######################################################
+# Artifact store configuration
+#######################################################
+DEFAULT_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+ARTIFACT_DIRNAME = "artifacts"
+MANIFEST_FILENAME = "manifest.jsonl"
+LOCK_FILENAME = "store.lock"
+ARTIFACT_MAX_BYTES = 200 * 1024 * 1024  # Disk budget for all blobs
+ARTIFACT_MAX_AGE_DAYS = 30              # Captures older than this are dropped
+# Loose captures written before the store existed: <stage>_<HHMMSS>.<ext>
+LEGACY_ARTIFACT_RE = re.compile(r"^(?P<stage>.+)_(?P<time>\d{6})\.(?P<ext>png|jpg|jpeg|webp|html)$")
+#######################################################
+
+class ArtifactStore:
+    """Blobs named by their sha256, plus an append-only manifest of captures"""
+
+    def __init__(self, root):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.manifest_path = os.path.join(root, MANIFEST_FILENAME)
+        self.lock_path = os.path.join(root, LOCK_FILENAME)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Exclusive lock on the store across processes (and threads - each call opens its own handle)"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK gives up after ~10s; keep waiting
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def blob_path(self, digest, extension):
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{extension}")
+
+    def prepare(self, data, extension):
+        """(digest, blob path) for data - cheap enough to call on the automation thread"""
+        digest = hashlib.sha256(data).hexdigest()
+        return digest, self.blob_path(digest, extension)
+
+    def put(self, data, run, stage, extension, at=None, digest=None):
+        """Store data (once per content) and record the capture; returns the blob path"""
+        if digest is None:
+            digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest, extension)
+        entry = {
+            "run": run,
+            "stage": stage,
+            "time": (at or datetime.now()).isoformat(timespec="seconds"),
+            "blob": os.path.relpath(path, self.root).replace(os.sep, "/"),
+            "bytes": len(data),
+        }
+        # Under the lock, so retention cannot delete the blob between the check and the append
+        with self.locked():
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            with open(self.manifest_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return path
+
+    def entries(self):
+        """Manifest entries in the order they were recorded, skipping torn lines"""
+        entries = []
+        try:
+            with open(self.manifest_path) as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return entries
+
+    def _stored_blobs(self):
+        """{relative blob path: size} for every blob on disk"""
+        blobs = {}
+        for directory, _, names in os.walk(self.blob_dir):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                blobs[os.path.relpath(path, self.root).replace(os.sep, "/")] = os.path.getsize(path)
+        return blobs
+
+    def enforce_retention(self, max_bytes=ARTIFACT_MAX_BYTES, max_age_days=ARTIFACT_MAX_AGE_DAYS, now=None):
+        """Drop old captures until the referenced blobs fit the budget; returns (entries, bytes) freed"""
+        if not os.path.exists(self.manifest_path):
+            return 0, 0
+        with self.locked():
+            return self._enforce_retention(max_bytes, max_age_days, now)
+
+    def _enforce_retention(self, max_bytes, max_age_days, now):
+        entries = self.entries()
+        cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).isoformat(timespec="seconds")
+        # The manifest is in recording order, not capture order (compacted legacy files, clock changes)
+        kept = sorted((entry for entry in entries if entry["time"] >= cutoff), key=lambda entry: entry["time"])
+        blobs = self._stored_blobs()
+
+        # Oldest captures go first; a blob is only freed once its last reference is gone
+        references = {}
+        for entry in kept:
+            references[entry["blob"]] = references.get(entry["blob"], 0) + 1
+        used = sum(blobs.get(blob, 0) for blob in references)
+        dropped = 0
+        while dropped < len(kept) and used > max_bytes:
+            entry = kept[dropped]
+            references[entry["blob"]] -= 1
+            if not references[entry["blob"]]:
+                del references[entry["blob"]]
+                used -= blobs.get(entry["blob"], 0)
+            dropped += 1
+        kept = kept[dropped:]
+
+        self._rewrite_manifest(kept)
+        freed = 0
+        for blob, size in blobs.items():
+            if blob not in references:
+                os.remove(os.path.join(self.root, blob))
+                freed += size
+        return len(entries) - len(kept), freed
+
+    def _rewrite_manifest(self, entries):
+        """Replace the manifest with entries (caller holds the lock)"""
+        temp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self.manifest_path)
+
+    def compact_directory(self, directory):
+        """Move loose <stage>_<HHMMSS>.<ext> captures in directory into the store; returns counts"""
+        moved = new_blobs = saved = 0
+        captures = []
+        for name in os.listdir(directory):
+            match = LEGACY_ARTIFACT_RE.match(name)
+            path = os.path.join(directory, name)
+            if not match or not os.path.isfile(path):
+                continue
+            # The name only has the time of day; the date comes from the file itself
+            modified = datetime.fromtimestamp(os.path.getmtime(path))
+            at = datetime.combine(modified.date(), datetime.strptime(match.group("time"), "%H%M%S").time())
+            captures.append((at, name, path, match))
+        # Record them oldest first, as live captures are
+        for at, name, path, match in sorted(captures):
+            with open(path, "rb") as f:
+                data = f.read()
+            digest, blob = self.prepare(data, match.group("ext"))
+            if os.path.exists(blob):
+                saved += len(data)
+            else:
+                new_blobs += 1
+            self.put(data, f"legacy-{at.date().isoformat()}", match.group("stage"), match.group("ext"),
+                     at=at, digest=digest)
+            os.remove(path)
+            moved += 1
+        return {"moved": moved, "new_blobs": new_blobs, "deduplicated_bytes": saved}
+
+    def resolve(self, ref):
+        """Blob path for a path or a '<run>:<stage>' reference (latest matching capture)"""
+        if os.path.exists(ref):
+            return ref
+        run, _, stage = ref.rpartition(":")
+        for entry in reversed(self.entries()):
+            if entry["run"].startswith(run) and entry["stage"] == stage:
+                return os.path.join(self.root, entry["blob"])
+        raise ValueError(f"No capture matches '{ref}'")
+
+    def stats(self):
+        entries = self.entries()
+        blobs = self._stored_blobs()
+        return {
+            "captures": len(entries),
+            "blobs": len(blobs),
+            "blob_bytes": sum(blobs.values()),
+            "captured_bytes": sum(entry["bytes"] for entry in entries),
+            "oldest": entries[0]["time"] if entries else None,
+        }
+
+def open_store(log_dir=DEFAULT_LOG_DIR):
+    return ArtifactStore(os.path.join(log_dir, ARTIFACT_DIRNAME))
+
+def load_snapshot(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def _controls_by_label(snapshot):
+    controls = collections.defaultdict(list)
+    for control in snapshot["buttons"]:
+        controls[(control["tag"], control["text"])].append(control)
+    return controls
+
+def diff_snapshots(old, new):
+    """Human-readable lines describing how the page changed between two text snapshots"""
+    lines = []
+    for key in ("url", "title"):
+        if old[key] != new[key]:
+            lines.append(f"{key}: {old[key]!r} -> {new[key]!r}")
+    old_texts, new_texts = set(old["texts"]), set(new["texts"])
+    lines += [f"- text {text!r}" for text in old["texts"] if text not in new_texts]
+    lines += [f"+ text {text!r}" for text in new["texts"] if text not in old_texts]
+
+    old_controls, new_controls = _controls_by_label(old), _controls_by_label(new)
+    for key in list(old_controls) + [key for key in new_controls if key not in old_controls]:
+        tag, text = key
+        before, after = old_controls.get(key, []), new_controls.get(key, [])
+        for old_control, new_control in zip(before, after):
+            changes = [f"{field} {old_control.get(field)} -> {new_control.get(field)}"
+                       for field in ("box", "cls", "disabled") if old_control.get(field) != new_control.get(field)]
+            if changes:
+                lines.append(f"~ {tag} {text!r}: " + ", ".join(changes))
+        lines += [f"- {tag} {text!r} at {control['box']}" for control in before[len(after):]]
+        lines += [f"+ {tag} {text!r} at {control['box']}" for control in after[len(before):]]
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the deduplicating screenshot/artifact store")
+    parser.add_argument("command", choices=["compact", "prune", "stats", "diff"])
+    parser.add_argument("refs", nargs="*", help="diff: OLD and NEW snapshot (blob path or <run>:<stage>)")
+    parser.add_argument("--logs", default=DEFAULT_LOG_DIR, help="directory holding the artifacts/ store")
+    parser.add_argument("--max-mb", type=float, default=ARTIFACT_MAX_BYTES / 1024 / 1024,
+                        help="disk budget for stored blobs")
+    parser.add_argument("--max-age-days", type=int, default=ARTIFACT_MAX_AGE_DAYS)
+    args = parser.parse_args()
+
+    store = open_store(args.logs)
+    if args.command == "diff":
+        if len(args.refs) != 2:
+            parser.error("diff needs OLD and NEW")
+        try:
+            old, new = (load_snapshot(store.resolve(ref)) for ref in args.refs)
+        except ValueError as e:
+            parser.error(str(e))
+        print("\n".join(diff_snapshots(old, new)) or "No differences")
+    else:
+        if args.command == "compact":
+            print(json.dumps(store.compact_directory(args.logs)))
+        if args.command in ("compact", "prune"):
+            dropped, freed = store.enforce_retention(int(args.max_mb * 1024 * 1024), args.max_age_days)
+            print(f"Retention: dropped {dropped} captures, freed {freed} bytes")
+        print(json.dumps(store.stats(), indent=2))
@@ -0,0 +1,145 @@
+"""End-to-end benchmark of script.py against the local stand-in site.
+
+Usage: python benchmark.py --iterations 10 --announcements 500 --button-delay 800
+       python benchmark.py --fast --iterations 50   # HTTP fast path only, no Chrome
+
+Starts mock_site.py on a free port, points script.py at it with a throwaway Chrome
+profile, runs the full main() flow repeatedly and reports per-phase and end-to-end
+wall time (mean / p50 / p95 / max). With --fast, the stand-in's session is written to
+the session file up front and main(fast=True) marks attendance over its JSON API.
+"""
+import argparse
+import collections
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import urllib.parse
+from datetime import datetime
+
+import mock_site
+import script
+
+# Span names recorded by script.py, in flow order
+PHASES = [
+    "fast_path",
+    "driver_startup",
+    "navigation",
+    "find_and_click_google_button",
+    "handle_session_feedback_improved",
+    "find_and_click_mark_attendance",
+    "handle_camera_and_present_button_fast",
+    "verify_success",
+]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(samples):
+    """mean/p50/p95/max in milliseconds for a list of seconds"""
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 1),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+def write_stand_in_session(server, base_url, path):
+    """Log in to the stand-in and save its cookie the way script.export_session does"""
+    cookie = {"name": mock_site.SESSION_COOKIE, "value": server.state.new_session(),
+              "domain": urllib.parse.urlparse(base_url).hostname, "path": "/", "httpOnly": True}
+    with open(path, "w") as f:
+        json.dump({"exported_at": datetime.now().isoformat(timespec="seconds"), "cookies": [cookie]}, f)
+
+def run_benchmark(iterations, fast=False, **site_config):
+    """Run main() `iterations` times against a fresh stand-in; returns the report dict"""
+    server, base_url = mock_site.start_server(**site_config)
+    profile_dir = tempfile.mkdtemp(prefix="kalvium-bench-")
+    timings = collections.defaultdict(list)
+    totals = []
+    outcomes = collections.Counter()
+
+    def listener(record):
+        timings[record["phase"]].append(record["duration_ms"] / 1000)
+
+    try:
+        script.KALVIUM_URL = base_url
+        # Keep the stand-in's cookies and locators away from the real state/ files
+        script.configure_account(user_data_dir=profile_dir, profile="Default",
+                                 greeting=f"Hi {server.state.config['user_name']}",
+                                 session_file=os.path.join(profile_dir, "session.json"),
+                                 strategy_cache_file=os.path.join(profile_dir, "strategy_cache.json"))
+        if fast:
+            write_stand_in_session(server, base_url, script.SESSION_FILE)
+        # script.py reports every phase span; collect their durations
+        script.span_listeners.append(listener)
+        for iteration in range(iterations):
+            # Every iteration starts absent, with the feedback dialog armed again
+            server.state.reset_attendance()
+            started = time.perf_counter()
+            outcome = script.main(fast=fast)
+            totals.append(time.perf_counter() - started)
+            outcomes[outcome] += 1
+            script.logger.info(f"Benchmark iteration {iteration + 1}/{iterations}: {outcome} "
+                               f"in {totals[-1]:.2f}s")
+    finally:
+        if listener in script.span_listeners:
+            script.span_listeners.remove(listener)
+        server.shutdown()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+    return {
+        "iterations": iterations,
+        "fast": fast,
+        "site": server.state.config,
+        "outcomes": dict(outcomes),
+        "end_to_end": summarize(totals),
+        "phases": {name: summarize(timings[name]) for name in PHASES + sorted(set(timings) - set(PHASES))
+                   if timings[name]},
+    }
+
+def format_report(report):
+    lines = [f"{'phase':<40} {'n':>4} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}"]
+    rows = list(report["phases"].items()) + [("END TO END", report["end_to_end"])]
+    for name, stats in rows:
+        lines.append(f"{name:<40} {stats['n']:>4} {stats['mean_ms']:>9} {stats['p50_ms']:>9} "
+                     f"{stats['p95_ms']:>9} {stats['max_ms']:>9}")
+    lines.append(f"outcomes: {report['outcomes']}  (times in ms)")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark script.py against the local Kalvium stand-in")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--page-delay", type=int, default=mock_site.DEFAULT_CONFIG["page_delay_ms"], help="ms")
+    parser.add_argument("--login-delay", type=int, default=mock_site.DEFAULT_CONFIG["login_delay_ms"], help="ms")
+    parser.add_argument("--button-delay", type=int, default=mock_site.DEFAULT_CONFIG["button_delay_ms"], help="ms")
+    parser.add_argument("--camera-delay", type=int, default=mock_site.DEFAULT_CONFIG["camera_delay_ms"], help="ms")
+    parser.add_argument("--api-delay", type=int, default=mock_site.DEFAULT_CONFIG["api_delay_ms"], help="ms")
+    parser.add_argument("--announcements", type=int, default=mock_site.DEFAULT_CONFIG["announcements"])
+    parser.add_argument("--no-feedback", action="store_true", help="never show the feedback dialog")
+    parser.add_argument("--headless", action="store_true", help="run Chrome headless with a synthetic camera")
+    parser.add_argument("--fast", action="store_true",
+                        help="benchmark the HTTP fast path (main(fast=True)) with a pre-seeded session")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    script.HEADLESS = args.headless
+
+    report = run_benchmark(
+        args.iterations,
+        fast=args.fast,
+        page_delay_ms=args.page_delay,
+        login_delay_ms=args.login_delay,
+        button_delay_ms=args.button_delay,
+        camera_delay_ms=args.camera_delay,
+        api_delay_ms=args.api_delay,
+        announcements=args.announcements,
+        feedback=not args.no_feedback,
+    )
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
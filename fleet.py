@@ -0,0 +1,152 @@
+"""Mark Kalvium attendance for many Chrome profiles concurrently.
+
+Usage: python fleet.py accounts.json --concurrency 3
+
+accounts.json is a list of accounts, for example:
+    [
+        {"name": "dinesh", "user_data_dir": "D:\\profiles\\dinesh", "profile": "Default", "greeting": "Hi Dinesh"},
+        {"name": "priya", "greeting": "Hi Priya"}
+    ]
+Accounts without "user_data_dir" get their own directory under state/fleet/<name>
+(log in once there with a normal run). Chrome can't share a user-data-dir between
+processes, so every account must have a distinct one.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import script
+
+logger = script.logger
+
+#######################################################
+# Fleet defaults
+#######################################################
+DEFAULT_CONCURRENCY = 2
+DEFAULT_BASE_PORT = 9300      # Worker i gets debugging port DEFAULT_BASE_PORT + i
+DEFAULT_LOGIN_INTERVAL = 5.0  # Minimum seconds between two accounts starting their login
+#######################################################
+
+def load_accounts(path):
+    """Read the accounts file and fill in per-account profile directories"""
+    with open(path) as f:
+        accounts = json.load(f)
+
+    seen = set()
+    for account in accounts:
+        if "name" not in account:
+            raise ValueError(f"Account without a name in {path}: {account}")
+        account.setdefault("user_data_dir", os.path.join(script.state_directory, "fleet", account["name"]))
+        account.setdefault("profile", "Default")
+        key = os.path.normcase(os.path.abspath(account["user_data_dir"]))
+        if key in seen:
+            raise ValueError(f"Accounts can't share user_data_dir: {account['user_data_dir']}")
+        seen.add(key)
+    return accounts
+
+def wait_for_login_slot(lock, last_login, interval):
+    """Block until at least `interval` seconds have passed since the previous account started"""
+    with lock:
+        delay = last_login.value + interval - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        last_login.value = time.time()
+
+def account_slug(account):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in account["name"])
+
+def account_log_filename(account):
+    """Per-account day log, so worker processes never share (and rotate) one file"""
+    return script.dated_log_path("kalvium_attendance", "log", f"_{account_slug(account)}")
+
+def run_account(account, debugging_port, login_lock, last_login, login_interval):
+    """Worker: run the attendance flow for one account on its own port and profile"""
+    # This worker's own log listener and file; tag its lines with the account name
+    script.setup_logging(account_log_filename(account))
+    formatter = logging.Formatter(f"%(asctime)s - %(levelname)s - [{account['name']}] %(message)s")
+    script.set_log_format(formatter)
+
+    # Rate-limit logins across all workers
+    wait_for_login_slot(login_lock, last_login, login_interval)
+
+    os.makedirs(account["user_data_dir"], exist_ok=True)
+    script.configure_account(
+        user_data_dir=account["user_data_dir"],
+        profile=account["profile"],
+        greeting=account.get("greeting"),
+        debugging_port=debugging_port,
+        session_file=os.path.join(script.state_directory, f"session_{account_slug(account)}.json"),
+        strategy_cache_file=os.path.join(script.state_directory, f"strategy_cache_{account_slug(account)}.json"),
+    )
+
+    started = time.time()
+    try:
+        outcome = script.main()
+    except Exception as e:
+        outcome = f"error: {e}"
+    return {
+        "account": account["name"],
+        "outcome": outcome,
+        "port": debugging_port,
+        "started": datetime.fromtimestamp(started).strftime("%H:%M:%S"),
+        "seconds": round(time.time() - started, 1),
+    }
+
+def run_fleet(accounts, concurrency=DEFAULT_CONCURRENCY, base_port=DEFAULT_BASE_PORT,
+              login_interval=DEFAULT_LOGIN_INTERVAL):
+    """Run every account through a process pool of at most `concurrency` workers"""
+    logger.info(f"=========== STARTING FLEET: {len(accounts)} accounts, concurrency {concurrency} ===========")
+    started = time.time()
+    results = []
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=concurrency) as pool:
+        login_lock = manager.Lock()
+        last_login = manager.Value("d", 0.0)
+        futures = {}
+        for index, account in enumerate(accounts):
+            future = pool.submit(run_account, account, base_port + index, login_lock, last_login, login_interval)
+            futures[future] = account
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({"account": futures[future]["name"], "outcome": f"error: {e}",
+                                "port": None, "started": None, "seconds": None})
+
+    results.sort(key=lambda result: result["account"])
+    logger.info(f"Fleet finished in {time.time() - started:.1f}s")
+    return results
+
+def format_table(results):
+    """Aligned text table of fleet results"""
+    columns = ["account", "outcome", "port", "started", "seconds"]
+    rows = [[str(result.get(column, "")) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    lines = ["  ".join(column.ljust(width) for column, width in zip(columns, widths)),
+             "  ".join("-" * width for width in widths)]
+    lines += ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mark Kalvium attendance for many profiles concurrently")
+    parser.add_argument("accounts", help="JSON file with the list of accounts")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="maximum number of browsers running at once")
+    parser.add_argument("--base-port", type=int, default=DEFAULT_BASE_PORT,
+                        help="first remote debugging port; each account gets its own")
+    parser.add_argument("--login-interval", type=float, default=DEFAULT_LOGIN_INTERVAL,
+                        help="minimum seconds between two accounts starting their login")
+    args = parser.parse_args()
+
+    results = run_fleet(load_accounts(args.accounts), args.concurrency, args.base_port, args.login_interval)
+    table = format_table(results)
+    print(table)
+
+    report_path = os.path.join(script.log_directory, f"fleet_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.json")
+    with open(report_path, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Fleet results saved to {report_path}")
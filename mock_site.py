@@ -0,0 +1,309 @@
+"""Local stand-in for kalvium.community, for benchmarking script.py without the live site.
+
+Usage: python mock_site.py --port 8765 --button-delay 1500 --announcements 500
+
+Reproduces the pages the script handles: the "Continue with Google" landing page,
+the dashboard with a "Mark Attendance" button, the "How was the session?" emoji
+feedback dialog, the camera / "I'm Present" screen and the "Yay! You're marked as
+present" confirmation. Delays and DOM size are configurable.
+"""
+import argparse
+import html
+import json
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+#######################################################
+# Stand-in defaults
+#######################################################
+DEFAULT_CONFIG = {
+    "user_name": "Dinesh",
+    "page_delay_ms": 0,        # Server latency before every HTML page
+    "login_delay_ms": 300,     # Time the fake Google redirect takes
+    "button_delay_ms": 500,    # Time until the dashboard renders "Mark Attendance"
+    "camera_delay_ms": 1000,   # Time until the camera screen shows "I'm Present"
+    "api_delay_ms": 100,       # Latency of the JSON endpoints
+    "announcements": 50,       # Announcement cards on the dashboard (DOM size)
+    "feedback": True,          # Show the "How was the session?" dialog once per session
+}
+SESSION_COOKIE = "kal_session"
+#######################################################
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+  body {{ font-family: sans-serif; margin: 0; }}
+  header {{ padding: 12px 24px; background: #1a1a2e; color: white; }}
+  main {{ padding: 24px; }}
+  .card {{ border: 1px solid #ddd; border-radius: 6px; padding: 8px 12px; margin: 6px 0; }}
+  .primary {{ background: #e94560; color: white; border: 0; padding: 12px 28px; font-size: 18px; }}
+  .modal {{ position: fixed; top: 80px; left: 30%; width: 40%; background: white;
+            border: 1px solid #999; padding: 24px; box-shadow: 0 4px 20px #0005; }}
+  .emoji {{ width: 48px; height: 48px; font-size: 28px; margin-right: 12px; }}
+  video {{ width: 320px; height: 240px; background: #000; display: block; }}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+LANDING_BODY = """
+<main>
+  <h1>Welcome to Kalvium</h1>
+  <p>Sign in to continue</p>
+  <button class="chakra-button" onclick="location.href='/auth/google'">
+    <img alt="Google" src="data:image/gif;base64,R0lGODlhAQABAAAAACw=" width="16" height="16">
+    Continue with Google
+  </button>
+</main>
+"""
+
+DASHBOARD_BODY = """
+<header>Hi {user_name}</header>
+<main>
+  <h2>My Day</h2>
+  <div id="attendance-slot">{attendance}</div>
+  <h3>Squad</h3>
+  <div class="card">Squad 42 - mentor sync at 4 pm</div>
+  <h3>Announcements</h3>
+  <div id="announcements">{announcements}</div>
+</main>
+{feedback}
+<script>
+  const buttonDelay = {button_delay_ms};
+  const slot = document.getElementById('attendance-slot');
+  if (!{present}) {{
+    setTimeout(() => {{
+      slot.innerHTML = '<button class="primary" id="mark-attendance">Mark Attendance</button>';
+      document.getElementById('mark-attendance').onclick = () => {{ location.href = '/attendance'; }};
+    }}, buttonDelay);
+  }}
+  const dialog = document.getElementById('feedback-dialog');
+  if (dialog) {{
+    let rating = null;
+    dialog.querySelectorAll('.emoji').forEach((el, i) => {{
+      el.onclick = () => {{ rating = i + 1; document.getElementById('feedback-submit').disabled = false; }};
+    }});
+    document.getElementById('feedback-submit').onclick = () => {{
+      fetch('/api/feedback', {{method: 'POST', body: JSON.stringify({{rating: rating}})}})
+        .then(() => dialog.remove());
+    }};
+  }}
+</script>
+"""
+
+FEEDBACK_DIALOG = """
+<div class="modal" id="feedback-dialog">
+  <h3>How was the session?</h3>
+  <div>
+    <button class="emoji">&#128577;</button><button class="emoji">&#128528;</button><button class="emoji">&#128512;</button>
+  </div>
+  <p><button id="feedback-submit" disabled>Submit</button></p>
+</div>
+"""
+
+CAMERA_BODY = """
+<main>
+  <h2>Mark your attendance</h2>
+  <video id="camera" autoplay muted playsinline></video>
+  <div id="present-slot"></div>
+</main>
+<script>
+  const cameraDelay = {camera_delay_ms};
+  const video = document.getElementById('camera');
+  if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {{
+    navigator.mediaDevices.getUserMedia({{video: true}})
+      .then(stream => {{ video.srcObject = stream; }})
+      .catch(err => console.log('camera unavailable', err));
+  }}
+  setTimeout(() => {{
+    const slot = document.getElementById('present-slot');
+    slot.innerHTML = '<button class="primary" id="present-button">I\\'m Present</button>';
+    document.getElementById('present-button').onclick = () => {{
+      fetch('/api/attendance/mark', {{method: 'POST'}})
+        .then(response => response.json())
+        .then(() => {{
+          document.querySelector('main').innerHTML =
+            '<h2>Yay! You\\'re marked as present</h2><p>Stay focussed and have a great session.</p>';
+        }});
+    }};
+  }}, cameraDelay);
+</script>
+"""
+
+class StandInState:
+    """Sessions and attendance for one stand-in server"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.sessions = {}  # session id -> {"present": bool, "feedback_pending": bool}
+
+    def new_session(self):
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = {"present": False, "feedback_pending": self.config["feedback"]}
+        return session_id
+
+    def get(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def reset_attendance(self):
+        """Mark every session absent again and re-arm the feedback dialog"""
+        with self.lock:
+            for session in self.sessions.values():
+                session["present"] = False
+                session["feedback_pending"] = self.config["feedback"]
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves the stand-in pages; self.server.state holds sessions and config"""
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    @property
+    def config(self):
+        return self.server.state.config
+
+    def session(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        if SESSION_COOKIE in cookie:
+            return cookie[SESSION_COOKIE].value, self.server.state.get(cookie[SESSION_COOKIE].value)
+        return None, None
+
+    def send_page(self, title, body, status=200):
+        time.sleep(self.config["page_delay_ms"] / 1000)
+        payload = PAGE_TEMPLATE.format(title=title, body=body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_json(self, data, status=200):
+        time.sleep(self.config["api_delay_ms"] / 1000)
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def redirect(self, location, cookie=None):
+        self.send_response(302)
+        self.send_header("Location", location)
+        if cookie:
+            self.send_header("Set-Cookie", f"{SESSION_COOKIE}={cookie}; Path=/; HttpOnly")
+        self.end_headers()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        session_id, session = self.session()
+
+        if path == "/auth/google":
+            # Stand-in for the Google OAuth round trip: the account is always signed in
+            time.sleep(self.config["login_delay_ms"] / 1000)
+            self.redirect("/", cookie=session_id if session else self.server.state.new_session())
+        elif session is None:
+            if path.startswith("/api/"):
+                self.send_json({"error": "unauthorized"}, status=401)
+            elif path == "/":
+                self.send_page("Kalvium", LANDING_BODY)
+            else:
+                self.redirect("/")
+        elif path == "/":
+            self.send_page("Kalvium", self.dashboard(session))
+        elif path == "/api/attendance/today":
+            # Used by script.py's HTTP fast path
+            self.send_json({"status": "present" if session["present"] else "absent"})
+        elif path == "/attendance":
+            self.send_page("Kalvium - Attendance", CAMERA_BODY.format(**self.config))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        _, session = self.session()
+        if session is None:
+            self.send_json({"error": "unauthorized"}, status=401)
+        elif path == "/api/feedback":
+            session["feedback_pending"] = False
+            self.send_json({"ok": True})
+        elif path == "/api/attendance/mark":
+            session["present"] = True
+            self.send_json({"status": "present"})
+        else:
+            self.send_error(404)
+
+    def dashboard(self, session):
+        announcements = "\n".join(
+            f'<div class="card"><b>Announcement {i}</b><p>Reminder #{i}: submit your weekly '
+            f'reflection and check the sprint board.</p></div>'
+            for i in range(self.config["announcements"])
+        )
+        if session["present"]:
+            attendance = "<div>Present</div><p>You're marked as present. Stay focussed!</p>"
+        else:
+            attendance = "<p>Loading your schedule...</p>"
+        return DASHBOARD_BODY.format(
+            user_name=html.escape(self.config["user_name"]),
+            attendance=attendance,
+            announcements=announcements,
+            feedback=FEEDBACK_DIALOG if session["feedback_pending"] and not session["present"] else "",
+            button_delay_ms=self.config["button_delay_ms"],
+            present="true" if session["present"] else "false",
+        )
+
+def start_server(port=0, **overrides):
+    """Start the stand-in on a background thread; returns (server, base_url)"""
+    config = dict(DEFAULT_CONFIG, **overrides)
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+    server.daemon_threads = True
+    server.state = StandInState(config)
+    threading.Thread(target=server.serve_forever, name="kalvium-stand-in", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for kalvium.community")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--user-name", default=DEFAULT_CONFIG["user_name"])
+    parser.add_argument("--page-delay", type=int, default=DEFAULT_CONFIG["page_delay_ms"], help="ms")
+    parser.add_argument("--login-delay", type=int, default=DEFAULT_CONFIG["login_delay_ms"], help="ms")
+    parser.add_argument("--button-delay", type=int, default=DEFAULT_CONFIG["button_delay_ms"], help="ms")
+    parser.add_argument("--camera-delay", type=int, default=DEFAULT_CONFIG["camera_delay_ms"], help="ms")
+    parser.add_argument("--api-delay", type=int, default=DEFAULT_CONFIG["api_delay_ms"], help="ms")
+    parser.add_argument("--announcements", type=int, default=DEFAULT_CONFIG["announcements"])
+    parser.add_argument("--no-feedback", action="store_true", help="never show the feedback dialog")
+    args = parser.parse_args()
+
+    server, base_url = start_server(
+        args.port,
+        user_name=args.user_name,
+        page_delay_ms=args.page_delay,
+        login_delay_ms=args.login_delay,
+        button_delay_ms=args.button_delay,
+        camera_delay_ms=args.camera_delay,
+        api_delay_ms=args.api_delay,
+        announcements=args.announcements,
+        feedback=not args.no_feedback,
+    )
+    print(f"Kalvium stand-in running at {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
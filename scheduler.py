@@ -0,0 +1,148 @@
+"""Mark Kalvium attendance automatically at each session's attendance window.
+
+Usage: python scheduler.py timetable.json --lead 180
+
+timetable.json lists the attendance windows in local time, for example:
+    [
+        {"name": "morning", "open": "09:30", "close": "09:45", "days": ["mon", "tue", "wed", "thu", "fri"]},
+        {"name": "afternoon", "open": "14:00", "close": "14:15"}
+    ]
+Windows without "days" apply every day. `lead` seconds before a window opens the
+browser is started, logged in and parked on the dashboard; at the opening time the
+dashboard is reloaded and the attendance flow runs straight away; if the button is
+late, the dashboard is watched until it appears rather than reloaded. Every window's
+outcome and its latency (seconds from window open to the end of the flow) are logged
+and appended to logs/schedule_results.jsonl.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import script
+
+logger = script.logger
+
+#######################################################
+# Scheduler defaults
+#######################################################
+DEFAULT_LEAD_SECONDS = 180   # Browser start + login budget before a window opens
+RETRY_INTERVAL = 30          # Seconds between re-tries while a window is still open
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+RESULTS_FILE = os.path.join(script.log_directory, "schedule_results.jsonl")
+#######################################################
+
+def parse_clock(value):
+    """'09:30' -> (9, 30)"""
+    hour, minute = value.split(":")
+    return int(hour), int(minute)
+
+def load_timetable(path):
+    """Read and validate the windows in the timetable file"""
+    with open(path) as f:
+        windows = json.load(f)
+    for window in windows:
+        for key in ("name", "open", "close"):
+            if key not in window:
+                raise ValueError(f"Window without '{key}' in {path}: {window}")
+        if parse_clock(window["close"]) <= parse_clock(window["open"]):
+            raise ValueError(f"Window '{window['name']}' closes before it opens")
+        days = [day.lower()[:3] for day in window.get("days", DAYS)]
+        unknown = set(days) - set(DAYS)
+        if unknown:
+            raise ValueError(f"Window '{window['name']}' has unknown days: {sorted(unknown)}")
+        window["days"] = days
+    return windows
+
+def next_window(windows, after):
+    """The earliest (window, opens, closes) whose close is later than `after`"""
+    candidates = []
+    for offset in range(8):
+        day = (after + timedelta(days=offset)).replace(second=0, microsecond=0)
+        for window in windows:
+            if DAYS[day.weekday()] not in window["days"]:
+                continue
+            open_hour, open_minute = parse_clock(window["open"])
+            close_hour, close_minute = parse_clock(window["close"])
+            opens = day.replace(hour=open_hour, minute=open_minute)
+            closes = day.replace(hour=close_hour, minute=close_minute)
+            if closes > after:
+                candidates.append((opens, closes, window))
+        if candidates:
+            opens, closes, window = min(candidates, key=lambda candidate: candidate[0])
+            return window, opens, closes
+    return None
+
+def sleep_until(moment):
+    """Sleep until a local datetime, in short steps so suspend/clock changes can't overshoot"""
+    while True:
+        remaining = (moment - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 60))
+
+def run_window(window, opens, closes, attach=False):
+    """Pre-warm, fire at `opens`, retry until `closes`; returns the result record"""
+    fire_at = max(opens, datetime.now())
+    attempts = 0
+    while True:
+        attempts += 1
+        outcome = script.main(attach=attach, fire_at=fire_at, wait_for_window=True, wait_until=closes)
+        # Latency ends when the flow settled, not after the browser teardown that follows
+        finished = script.last_run["flow_finished"] or datetime.now()
+        if outcome in ("present", "already_present", "unverified"):
+            break
+        if datetime.now() + timedelta(seconds=RETRY_INTERVAL) >= closes:
+            break
+        logger.warning(f"Window '{window['name']}': {outcome}, trying again in {RETRY_INTERVAL}s")
+        fire_at = datetime.now() + timedelta(seconds=RETRY_INTERVAL)
+
+    latency = (finished - opens).total_seconds()
+    logger.info(f"Window '{window['name']}' ({opens.strftime('%H:%M')}): {outcome} "
+                f"{latency:.1f}s after it opened ({attempts} run{'s' if attempts > 1 else ''})")
+    return {
+        "window": window["name"],
+        "opens": opens.isoformat(timespec="seconds"),
+        "outcome": outcome,
+        "latency_s": round(latency, 1),
+        "attempts": attempts,
+    }
+
+def run_scheduler(windows, lead=DEFAULT_LEAD_SECONDS, attach=False, once=False):
+    """Serve every window in the timetable, forever (or just the next one with once=True)"""
+    logger.info(f"=========== STARTING KALVIUM SCHEDULER: {len(windows)} windows, lead {lead}s ===========")
+    after = datetime.now()
+    while True:
+        upcoming = next_window(windows, after)
+        if upcoming is None:
+            logger.error("No attendance window in the coming week, stopping")
+            return
+        window, opens, closes = upcoming
+        warm_at = opens - timedelta(seconds=lead)
+        logger.info(f"Next window '{window['name']}' {opens.strftime('%a %H:%M')}-{closes.strftime('%H:%M')}, "
+                    f"pre-warming at {warm_at.strftime('%H:%M:%S')}")
+        sleep_until(warm_at)
+        script.setup_logging()  # After midnight, a new day's log and spans file
+
+        result = run_window(window, opens, closes, attach=attach)
+        with open(RESULTS_FILE, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        if once:
+            return result
+        after = max(closes, datetime.now())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mark Kalvium attendance at each attendance window")
+    parser.add_argument("timetable", help="JSON file with the attendance windows")
+    parser.add_argument("--lead", type=int, default=DEFAULT_LEAD_SECONDS,
+                        help="seconds before a window opens to start the browser and log in")
+    parser.add_argument("--attach", action="store_true",
+                        help="use the warm browser daemon (script.py --daemon) instead of starting Chrome")
+    parser.add_argument("--once", action="store_true", help="serve only the next window, then exit")
+    args = parser.parse_args()
+
+    try:
+        run_scheduler(load_timetable(args.timetable), lead=args.lead, attach=args.attach, once=args.once)
+    except KeyboardInterrupt:
+        logger.info("Scheduler stopped")
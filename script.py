@@ -2,423 +2,2444 @@ from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import WebDriverException, SessionNotCreatedException
 import time
 import logging
+import logging.handlers
 from datetime import datetime
 import os
+import re
+import json
+import subprocess
+import argparse
+import urllib.parse
+import urllib.request
+import base64
+import collections
+import contextlib
+import functools
+import uuid
+import random
+import queue
+import threading
 import traceback
+import atexit
+import gzip
+import hashlib
+import shutil
+import tempfile
 import psutil
+import requests
+
+import artifacts
 
 #######################################################
 # Chrome Profile Path - Using existing Chrome profile
 #######################################################
 CHROME_USER_DATA_DIR = r"C:\Users\LENOVO\AppData\Local\Google\Chrome\User Data"
 CHROME_PROFILE = "Profile 1"  # Use the correct profile name for K Dinesh
+USER_GREETING = "Hi Dinesh"   # Dashboard greeting that proves we are logged in
+DEBUGGING_PORT = 9222
+KALVIUM_URL = "https://kalvium.community"
+HEADLESS = False      # Run Chrome without a window (implies FAKE_CAMERA)
+FAKE_CAMERA = False   # Use Chrome's synthetic camera stream instead of the real webcam
+EPHEMERAL_PROFILE = False  # Throwaway profile seeded from state/session.json instead of the one above
+#######################################################
+
+# Logs/screenshots go to logs/, caches and other persistent state to state/
+script_directory = os.path.dirname(os.path.abspath(__file__))
+state_directory = os.path.join(script_directory, "state")
+
+#######################################################
+# Logging - a background listener does the disk/console I/O
+#######################################################
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Roll the day log over at this size...
+LOG_BACKUP_COUNT = 10            # ...keeping this many gzipped parts (.log.1.gz is the newest)
+LOG_MAX_URL_CHARS = 120          # Longer URLs (OAuth redirects) are cut and tagged with a hash
+LOG_MAX_MESSAGE_CHARS = 4000     # Longer messages (page text dumps) are cut and tagged with a hash
 #######################################################
 
-# Set up logging
-log_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+log_directory = os.path.join(script_directory, "logs")
 os.makedirs(log_directory, exist_ok=True)
-log_filename = os.path.join(log_directory, f"kalvium_attendance_{datetime.now().strftime('%Y-%m-%d')}.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_filename),
-        logging.StreamHandler()
-    ]
-)
+
+def dated_log_path(prefix, extension, suffix=""):
+    """logs/<prefix>_<today><suffix>.<extension> - looked up per run, as the scheduler outlives a day"""
+    return os.path.join(log_directory, f"{prefix}_{datetime.now().strftime('%Y-%m-%d')}{suffix}.{extension}")
+
+_URL_RE = re.compile(r"https?://[^\s'\"<>]+")
+
+def _shorten(text, limit):
+    """Cut text to limit characters, keeping a hash of the whole so repeats can still be matched"""
+    if len(text) <= limit:
+        return text
+    digest = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()[:10]
+    return f"{text[:limit]}...[{len(text)} chars #{digest}]"
+
+class TruncatingFilter(logging.Filter):
+    """Shortens long URLs and oversized messages before they are queued"""
+
+    def filter(self, record):
+        message = record.getMessage()
+        shortened = _URL_RE.sub(lambda m: _shorten(m.group(0), LOG_MAX_URL_CHARS), message)
+        shortened = _shorten(shortened, LOG_MAX_MESSAGE_CHARS)
+        if shortened != message:
+            record.msg, record.args = shortened, None
+        return True
+
+def _gzip_rotator(source, dest):
+    """Compress a rolled-over log part; written under a temporary name so readers never see half a file"""
+    with open(source, "rb") as f_in, gzip.open(dest + ".tmp", "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.replace(dest + ".tmp", dest)
+    os.remove(source)
+
+_log_state = {"pid": None, "requested": None, "filename": None, "span_filename": None,
+              "listeners": [], "queue_handlers": [], "handlers": []}
+log_output_handlers = []  # The file and console handlers behind the root logger's queue
+
+def _start_log_listener(logger_, *handlers):
+    """Route logger_ through a queue; a QueueListener thread feeds `handlers`"""
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(TruncatingFilter())
+    logger_.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    _log_state["listeners"].append(listener)
+    _log_state["handlers"].extend(handlers)
+    _log_state["queue_handlers"].append((logger_, queue_handler))
+
+def _stop_log_listeners():
+    """Drain and stop this process's listeners (threads inherited through fork don't exist)
+    and close the files behind them"""
+    if _log_state["pid"] == os.getpid():
+        for listener in _log_state["listeners"]:
+            listener.stop()
+    _log_state["listeners"].clear()
+    for logger_, queue_handler in _log_state["queue_handlers"]:
+        logger_.removeHandler(queue_handler)
+    _log_state["queue_handlers"].clear()
+    for handler in _log_state["handlers"]:
+        handler.close()
+    _log_state["handlers"].clear()
+
+def set_log_format(formatter):
+    """Use formatter for the file and console output (e.g. to tag a fleet worker's lines)"""
+    for handler in log_output_handlers:
+        handler.setFormatter(formatter)
+
+def setup_logging(filename=None):
+    """Start this process's log listener, writing to filename (default: today's day log).
+
+    Cheap to call again: it only acts in a new process - a forked worker inherits the
+    queue handlers but not the listener thread that drains them - when filename names
+    a different log file (fleet.py gives every account its own; without one, the file
+    chosen last is kept), or when the date has changed, so the scheduler and the
+    browser daemon write each day's runs to that day's log and spans file.
+    """
+    same_process = _log_state["pid"] == os.getpid()
+    if filename is None and same_process:
+        filename = _log_state["requested"]
+    requested = filename
+    filename = filename or dated_log_path("kalvium_attendance", "log")
+    span_filename = dated_log_path("spans", "jsonl")
+    if same_process and (filename, span_filename) == (_log_state["filename"], _log_state["span_filename"]):
+        return
+    _stop_log_listeners()
+    file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    file_handler.namer = lambda name: name + ".gz"
+    file_handler.rotator = _gzip_rotator
+    log_output_handlers[:] = [file_handler, logging.StreamHandler()]
+    set_log_format(logging.Formatter(LOG_FORMAT))
+    logging.getLogger().setLevel(logging.INFO)
+    _start_log_listener(logging.getLogger(), *log_output_handlers)
+    _start_log_listener(span_logger, logging.FileHandler(span_filename, delay=True))
+    _log_state.update(pid=os.getpid(), requested=requested, filename=filename, span_filename=span_filename)
+
+atexit.register(_stop_log_listeners)  # Drains whatever is still queued
 logger = logging.getLogger(__name__)
 
-def kill_chrome_processes():
-    """Kill any running Chrome processes to avoid profile lock issues"""
+#######################################################
+# Timing spans - one JSON line per phase for machine analysis
+# (logs/spans_<date>.jsonl, opened by setup_logging)
+#######################################################
+
+span_logger = logging.getLogger("kalvium.spans")
+span_logger.propagate = False
+setup_logging()
+span_listeners = []  # Callables receiving every finished span (e.g. benchmark.py)
+_span_state = {"run": None, "stack": [], "attempts": collections.Counter()}
+
+def start_run():
+    """Begin a new run id; spans recorded afterwards carry it"""
+    _span_state["run"] = uuid.uuid4().hex[:12]
+    _span_state["attempts"].clear()
+    return _span_state["run"]
+
+@contextlib.contextmanager
+def span(phase):
+    """Time a phase; yields the span record so callers can set 'strategy' or 'outcome'"""
+    _span_state["attempts"][phase] += 1
+    record = {
+        "run": _span_state["run"],
+        "phase": phase,
+        "attempt": _span_state["attempts"][phase],
+        "strategy": None,
+        "start": datetime.now().isoformat(timespec="milliseconds"),
+        "duration_ms": None,
+        "outcome": "success",
+    }
+    started = time.perf_counter()
+    _span_state["stack"].append(record)
+    try:
+        yield record
+    except Exception as e:
+        record["outcome"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        _span_state["stack"].pop()
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        span_logger.info(json.dumps(record))
+        for listener in span_listeners:
+            listener(record)
+
+def set_strategy(strategy):
+    """Record which sub-strategy the current phase used (e.g. 'approach 2')"""
+    if _span_state["stack"]:
+        _span_state["stack"][-1]["strategy"] = strategy
+
+def timed_phase(phase):
+    """Decorator: run the function inside span(phase); a falsy result is recorded as 'failure'"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(phase) as record:
+                result = function(*args, **kwargs)
+                if not result:
+                    record["outcome"] = "failure"
+                return result
+        return wrapper
+    return decorator
+
+#######################################################
+# Wait engine - condition-driven waits instead of fixed sleeps
+#######################################################
+# Maximum seconds each phase may wait for its page condition
+PHASE_DEADLINES = {
+    "page_load": 30,
+    "login_redirect": 5,
+    "login": 15,
+    "feedback": 3,
+    "dashboard": 8,
+    "attendance_button": 8,
+    "camera": 10,
+    "present": 6,
+    "google_button": 10,
+    "attendance_click": 5,
+    "settle": 3,
+}
+# Poll interval starts short and grows while the page is still busy
+POLL_INITIAL = 0.05
+POLL_MAX = 0.5
+POLL_GROWTH = 1.5
+#######################################################
+
+def condition(description, check):
+    """Attach a readable name to a condition callable (driver -> truthy value)"""
+    check.description = description
+    return check
+
+def url_matches(pattern):
+    """Condition: current URL matches the regular expression"""
+    regex = re.compile(pattern, re.IGNORECASE)
+    return condition(f"URL matches '{pattern}'",
+                     lambda driver: regex.search(driver.current_url) is not None)
+
+def url_changes(from_url):
+    """Condition: current URL is different from the given one"""
+    return condition("URL changes", lambda driver: driver.current_url != from_url)
+
+def on_kalvium():
+    """Condition: browser is on the KALVIUM_URL host (not Google sign-in)"""
+    return url_matches(re.escape(urllib.parse.urlparse(KALVIUM_URL).netloc))
+
+def element_visible(by, locator):
+    """Condition: at least one matching element is displayed; returns that element"""
+    def check(driver):
+        for element in driver.find_elements(by, locator):
+            if element.is_displayed():
+                return element
+        return False
+    return condition(f"element visible {locator}", check)
+
+def text_present(*phrases):
+    """Condition: any of the phrases appears in the page text; returns the phrase"""
+    wanted = [phrase.lower() for phrase in phrases]
+    def check(driver):
+        match = first_visible_text(driver, wanted)
+        return match[0] if match else False
+    return condition(f"text present {phrases}", check)
+
+def text_absent(*phrases):
+    """Condition: none of the phrases appears in the page text"""
+    present = text_present(*phrases)
+    return condition(f"text absent {phrases}", lambda driver: not present(driver))
+
+def network_idle(quiet_ms=500):
+    """Condition: document loaded and no new resource finished for quiet_ms"""
+    def check(driver):
+        return kal(driver, "networkIdle", quiet_ms)
+    return condition(f"network idle {quiet_ms}ms", check)
+
+def first_match(candidates):
+    """Condition: the first matching [name, kind, selector, expected_text] candidate is clicked,
+    all in one page call (see __kal clickFirst); returns {"name", "locator", "result"}"""
+    return condition("first of: " + ", ".join(candidate[0] for candidate in candidates),
+                     lambda driver: kal(driver, "clickFirst", candidates))
+
+def all_of(*conditions):
+    """Condition: every condition holds; returns the last value"""
+    def check(driver):
+        result = False
+        for cond in conditions:
+            result = cond(driver)
+            if not result:
+                return False
+        return result
+    return condition(" and ".join(c.description for c in conditions), check)
+
+def poll_until(check, timeout):
+    """Poll check() with a growing interval; returns its truthy value or None on timeout"""
+    deadline = time.monotonic() + timeout
+    interval = POLL_INITIAL
+    while True:
+        try:
+            result = check()
+            if result:
+                return result
+        except WebDriverException:
+            # The page is navigating or an element went stale - keep polling
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * POLL_GROWTH, POLL_MAX)
+
+def wait_for(driver, phase, *conditions, timeout=None):
+    """Wait until any condition holds within the phase deadline; returns its value or None"""
+    timeout = PHASE_DEADLINES[phase] if timeout is None else timeout
+    description = " or ".join(c.description for c in conditions)
+    started = time.monotonic()
+
+    def check():
+        for cond in conditions:
+            result = cond(driver)
+            if result:
+                return result
+        return False
+
+    result = poll_until(check, timeout)
+    elapsed = time.monotonic() - started
+    if result is None:
+        logger.warning(f"[{phase}] Gave up after {elapsed:.2f}s waiting for: {description}")
+    else:
+        logger.info(f"[{phase}] Ready after {elapsed:.2f}s: {description}")
+    return result
+
+#######################################################
+# Page library - every detector, registered once per document as window.__kal
+#######################################################
+PAGE_LIBRARY_JS = r"""
+(function () {
+    if (window.__kal) return;
+    const detectors = {};
+
+    // ---- Text index: one TreeWalker pass answers every phrase lookup ----
+    const SNIPPET_RADIUS = 60;
+    const MAX_OCCURRENCES = 50;
+    const SKIPPED_TAGS = {SCRIPT: true, STYLE: true, NOSCRIPT: true, TEMPLATE: true};
+    const index = {dirty: true, text: '', starts: [], nodes: []};
+
+    // Any DOM change invalidates the index; it is rebuilt lazily on the next query
+    new MutationObserver(() => { index.dirty = true; })
+        .observe(document, {subtree: true, childList: true, characterData: true});
+
+    function build() {
+        const parts = [];
+        const starts = [];
+        const nodes = [];
+        let offset = 0;
+        const root = document.body || document.documentElement;
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT, {
+            acceptNode(node) {
+                const parent = node.parentNode;
+                if (!parent || SKIPPED_TAGS[parent.nodeName]) return NodeFilter.FILTER_REJECT;
+                return node.nodeValue.trim() ? NodeFilter.FILTER_ACCEPT : NodeFilter.FILTER_REJECT;
+            }
+        });
+        for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            const value = node.nodeValue.replace(/\s+/g, ' ').trim().toLowerCase();
+            starts.push(offset);
+            nodes.push(node);
+            parts.push(value);
+            offset += value.length + 1;
+        }
+        index.text = parts.join(' ');
+        index.starts = starts;
+        index.nodes = nodes;
+        index.dirty = false;
+    }
+
+    function nodeAt(offset) {
+        let low = 0;
+        let high = index.starts.length - 1;
+        while (low < high) {
+            const mid = (low + high + 1) >> 1;
+            if (index.starts[mid] <= offset) low = mid; else high = mid - 1;
+        }
+        return index.nodes[low];
+    }
+
+    function isVisible(node, cache) {
+        const el = node.parentElement;
+        if (!el) return false;
+        if (cache.has(el)) return cache.get(el);
+        let visible;
+        if (el.checkVisibility) {
+            visible = el.checkVisibility({checkOpacity: true, checkVisibilityCSS: true});
+        } else {
+            visible = el.getClientRects().length > 0;
+        }
+        cache.set(el, visible);
+        return visible;
+    }
+
+    function snippet(position, length) {
+        const start = Math.max(0, position - SNIPPET_RADIUS);
+        const end = Math.min(index.text.length, position + length + SNIPPET_RADIUS);
+        return (start > 0 ? '…' : '') + index.text.slice(start, end) + (end < index.text.length ? '…' : '');
+    }
+
+    // Returns {phrase: {visible, snippet} | null}; visible matches win over hidden ones
+    detectors.texts = function (phrases) {
+        if (index.dirty) build();
+        const cache = new Map();
+        const results = {};
+        for (const phrase of phrases) {
+            let hidden = null;
+            let found = null;
+            let position = index.text.indexOf(phrase);
+            for (let n = 0; position !== -1 && n < MAX_OCCURRENCES; n++) {
+                if (isVisible(nodeAt(position), cache)) {
+                    found = {visible: true, snippet: snippet(position, phrase.length)};
+                    break;
+                }
+                if (!hidden) hidden = {visible: false, snippet: snippet(position, phrase.length)};
+                position = index.text.indexOf(phrase, position + 1);
+            }
+            results[phrase] = found || hidden;
+        }
+        return results;
+    };
+
+
+    // Document loaded and no new resource has finished for quietMs
+    const netIdle = {count: -1, since: 0};
+    detectors.networkIdle = function (quietMs) {
+        const now = performance.now();
+        const count = performance.getEntriesByType('resource').length;
+        if (netIdle.count !== count) {
+            netIdle.count = count;
+            netIdle.since = now;
+        }
+        return document.readyState === 'complete' && (now - netIdle.since) >= quietMs;
+    };
+
+    // Bounded DOM snapshot for the flight recorder
+    detectors.domSnapshot = function (maxChars) {
+        const html = document.documentElement.outerHTML;
+        const header = '<!-- ' + location.href.slice(0, 500) + ' | ' + document.title + ' -->\n';
+        return header + (html.length > maxChars ? html.slice(0, maxChars) + '\n<!-- truncated -->' : html);
+    };
+
+    // Compact text snapshot: visible text and the buttons/links with their labels and boxes
+    const CONTROL_SELECTOR = 'button, a[href], [role="button"], input[type="submit"], input[type="button"]';
+    detectors.textSnapshot = function (maxTexts, maxTextChars) {
+        if (index.dirty) build();
+        const cache = new Map();
+        const texts = [];
+        const seen = new Set();
+        for (const node of index.nodes) {
+            if (texts.length >= maxTexts) break;
+            const value = node.nodeValue.replace(/\s+/g, ' ').trim().slice(0, maxTextChars);
+            if (seen.has(value) || !isVisible(node, cache)) continue;
+            seen.add(value);
+            texts.push(value);
+        }
+        const buttons = [];
+        for (const el of document.querySelectorAll(CONTROL_SELECTOR)) {
+            if (buttons.length >= maxTexts) break;
+            const rect = el.getBoundingClientRect();
+            if (!rect.width || !rect.height) continue;
+            const label = (el.innerText || el.value || el.getAttribute('aria-label') ||
+                           (el.querySelector('img[alt]') || {}).alt || '').replace(/\s+/g, ' ').trim();
+            const control = {
+                tag: el.tagName.toLowerCase(),
+                text: label.slice(0, maxTextChars),
+                cls: (el.getAttribute('class') || '').slice(0, 120),
+                box: [Math.round(rect.x), Math.round(rect.y), Math.round(rect.width), Math.round(rect.height)],
+            };
+            if (el.disabled) control.disabled = true;
+            buttons.push(control);
+        }
+        return {url: location.href.slice(0, 500), title: document.title, texts: texts, buttons: buttons};
+    };
+
+    // ---- Composite locators: race every strategy in one call, remember what was clicked ----
+    let lastClicked = null;
+
+    function cssPath(el) {
+        const parts = [];
+        while (el && el.nodeType === 1 && el !== document.documentElement) {
+            if (el.id) {
+                parts.unshift('#' + CSS.escape(el.id));
+                break;
+            }
+            let nth = 1;
+            for (let sibling = el.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+                if (sibling.tagName === el.tagName) nth++;
+            }
+            parts.unshift(el.tagName.toLowerCase() + ':nth-of-type(' + nth + ')');
+            el = el.parentElement;
+        }
+        return parts.join(' > ');
+    }
+
+    function remember(el) {
+        lastClicked = cssPath(el);
+        return el;
+    }
+
+
+    // First element matching an XPath / CSS locator that is visible, enabled and carries expectedText
+    function findClickable(kind, selector, expectedText) {
+        let matches;
+        try {
+            if (kind === 'xpath') {
+                const snapshot = document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+                matches = [];
+                for (let i = 0; i < snapshot.snapshotLength; i++) matches.push(snapshot.snapshotItem(i));
+            } else {
+                matches = Array.from(document.querySelectorAll(selector));
+            }
+        } catch (e) {
+            return null;
+        }
+        for (const el of matches) {
+            const clickable = el.closest('button, a, [role="button"]') || el;
+            if (clickable.disabled || el.disabled) continue;
+            const rect = el.getBoundingClientRect();
+            if (rect.width === 0 || rect.height === 0) continue;
+            if (expectedText) {
+                const text = (clickable.innerText || clickable.textContent || '') + ' ' +
+                    Array.from(clickable.querySelectorAll('img')).map(img => (img.alt || '') + ' ' + (img.src || '')).join(' ');
+                if (!text.toLowerCase().includes(expectedText)) continue;
+            }
+            return el;
+        }
+        return null;
+    }
+
+    // Composite locator: every [name, kind, selector, expectedText] candidate is checked in
+    // priority order within one call and the first match is acted on. kind is 'xpath',
+    // 'css selector', 'detector' (a clicking detector by name) or 'text' (phrases whose
+    // visible presence means the step is already done - nothing is clicked)
+    detectors.clickFirst = function (candidates) {
+        for (const [name, kind, selector, expectedText] of candidates) {
+            if (kind === 'text') {
+                const found = detectors.texts(selector);
+                if (selector.some(phrase => found[phrase] && found[phrase].visible)) {
+                    return {name: name, locator: null, result: 'text present'};
+                }
+            } else if (kind === 'detector') {
+                lastClicked = null;
+                const result = detectors[selector]();
+                if (result) {
+                    return {name: name, locator: lastClicked ? ['css selector', lastClicked] : null, result: String(result)};
+                }
+            } else {
+                const el = findClickable(kind, selector, expectedText);
+                if (el) {
+                    remember(el).click();
+                    return {name: name, locator: [kind, selector], result: cssPath(el)};
+                }
+            }
+        }
+        return false;
+    };
+
+    // ---- Camera readiness: a granted stream or a video with enough data ----
+    const camera = {streamGranted: false, waiters: []};
+
+    function notifyCamera() {
+        const waiters = camera.waiters;
+        camera.waiters = [];
+        waiters.forEach(check => check());
+    }
+
+    // Registered before the page's own scripts, so the page's getUserMedia call is observed
+    if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {
+        const getUserMedia = navigator.mediaDevices.getUserMedia.bind(navigator.mediaDevices);
+        navigator.mediaDevices.getUserMedia = function (constraints) {
+            return getUserMedia(constraints).then(stream => {
+                camera.streamGranted = true;
+                notifyCamera();
+                return stream;
+            });
+        };
+    }
+    ['loadeddata', 'canplay', 'canplaythrough', 'playing'].forEach(type =>
+        document.addEventListener(type, notifyCamera, true));
+
+    function cameraState(buttonXPath) {
+        for (const video of document.querySelectorAll('video')) {
+            if (video.readyState >= 4) return 'video has enough data';  // HAVE_ENOUGH_DATA
+        }
+        if (camera.streamGranted) return 'getUserMedia resolved';
+        if (buttonXPath && findClickable('xpath', buttonXPath, null)) return 'Present button ready';
+        return false;
+    }
+
+    // Promise resolving with what made the camera screen ready, or false after timeoutMs
+    detectors.cameraReady = function (timeoutMs, buttonXPath) {
+        return new Promise(resolve => {
+            let finished = false;
+            const observer = new MutationObserver(check);
+            const timer = setTimeout(() => finish(false), timeoutMs);
+            function finish(value) {
+                if (finished) return;
+                finished = true;
+                observer.disconnect();
+                clearTimeout(timer);
+                resolve(value);
+            }
+            function check() {
+                const state = cameraState(buttonXPath);
+                if (state) finish(state); else if (!finished) camera.waiters.push(check);
+            }
+            observer.observe(document, {subtree: true, childList: true, attributes: true,
+                                        attributeFilter: ['disabled', 'style', 'class']});
+            check();
+        });
+    };
+
+    // ---- Attendance window: a MutationObserver flags the Mark Attendance button's arrival ----
+    const attendanceWatch = {observer: null, ready: false, pending: null, checks: 0};
+
+    // Installs the watcher on first call; afterwards just reads the flag (no DOM work)
+    detectors.watchAttendance = function (xpath) {
+        if (!attendanceWatch.observer) {
+            const check = () => {
+                attendanceWatch.pending = null;
+                attendanceWatch.checks++;
+                if (findClickable('xpath', xpath, null)) {
+                    attendanceWatch.ready = true;
+                    attendanceWatch.observer.disconnect();
+                }
+            };
+            // Coalesce bursts of mutations into one XPath evaluation
+            attendanceWatch.observer = new MutationObserver(() => {
+                if (!attendanceWatch.pending && !attendanceWatch.ready) attendanceWatch.pending = setTimeout(check, 50);
+            });
+            attendanceWatch.observer.observe(document, {subtree: true, childList: true, attributes: true,
+                                                        attributeFilter: ['disabled', 'class', 'style', 'hidden']});
+            check();
+        }
+        return {ready: attendanceWatch.ready, checks: attendanceWatch.checks};
+    };
+
+    // ---- Detectors for each phase ----
+    detectors.feedbackEmoji = function () {
+        // IMPROVED EMOJI DETECTION
+        // -------------------------
+
+        // Function to get element's absolute position
+        function getAbsolutePosition(element) {
+            const rect = element.getBoundingClientRect();
+            return {
+                top: rect.top + window.scrollY,
+                left: rect.left + window.scrollX,
+                width: rect.width,
+                height: rect.height,
+                bottom: rect.bottom + window.scrollY,
+                right: rect.right + window.scrollX,
+                area: rect.width * rect.height
+            };
+        }
+
+        // Step 1: Find all possible emoji candidates (small clickable items in a horizontal row)
+        const allClickable = document.querySelectorAll('button, img, svg, [role="button"], div');
+        const candidates = Array.from(allClickable).filter(el => {
+            // Must be visible
+            if (el.offsetHeight === 0 || el.offsetWidth === 0) return false;
+
+            // Typical emoji size
+            const rect = el.getBoundingClientRect();
+            return rect.width >= 20 && rect.width <= 80 && rect.height >= 20 && rect.height <= 80;
+        });
+
+        console.log("Found " + candidates.length + " potential emoji candidates");
+
+        // Step 2: Group candidates that appear to be in a horizontal row (similar y-position)
+        const groups = [];
+        candidates.forEach(candidate => {
+            const pos = getAbsolutePosition(candidate);
+
+            // Find a group with similar y-position
+            let foundGroup = false;
+            for (const group of groups) {
+                const firstItemPos = getAbsolutePosition(group[0]);
+                // If within ~10px vertically, consider it the same row
+                if (Math.abs(pos.top - firstItemPos.top) < 20) {
+                    group.push(candidate);
+                    foundGroup = true;
+                    break;
+                }
+            }
+
+            if (!foundGroup) {
+                groups.push([candidate]);
+            }
+        });
+
+        console.log("Found " + groups.length + " potential groups");
+
+        // Step 3: Find groups with exactly 3 items or closest to it
+        let bestGroup = null;
+        let bestScore = 0;
+
+        for (const group of groups) {
+            // Score based on how close to 3 items and if they're in the upper half of page
+            const pos = getAbsolutePosition(group[0]);
+            const pageCenter = window.innerHeight / 2;
+            const scoreForPosition = (pos.top < pageCenter) ? 3 : 1; // Prefer upper half
+            const scoreForCount = (group.length === 3) ? 10 : (5 - Math.abs(group.length - 3));
+
+            const totalScore = scoreForPosition * scoreForCount;
+
+            if (totalScore > bestScore) {
+                bestScore = totalScore;
+                bestGroup = group;
+            }
+        }
+
+        if (!bestGroup || bestGroup.length === 0) {
+            console.log("Could not identify emoji group");
+            return false;
+        }
+
+        console.log("Found best group with " + bestGroup.length + " items");
+
+        // Sort the group horizontally (left to right)
+        bestGroup.sort((a, b) => {
+            const posA = getAbsolutePosition(a);
+            const posB = getAbsolutePosition(b);
+            return posA.left - posB.left;
+        });
+
+        // Click the last item (3rd one if 3 items, otherwise the last one for positive)
+        const emojiToClick = bestGroup[bestGroup.length - 1]; // Last/rightmost emoji
+        emojiToClick.click();
+
+        return "Clicked the rightmost emoji in a group of " + bestGroup.length;
+    };
+
+    detectors.feedbackSubmit = function () {
+        // IMPROVED SUBMIT BUTTON DETECTION
+        // --------------------------------
+
+        // First try to find submit button by text
+        const submitTexts = ['submit', 'ok', 'okay', 'done', 'confirm', 'next', 'save'];
+        const buttons = document.querySelectorAll('button, [role="button"], input[type="submit"]');
+
+        // Try matching by text first
+        for (const button of buttons) {
+            if (button.offsetHeight === 0 || button.offsetWidth === 0) continue;
+
+            const text = (button.innerText || button.textContent || '').toLowerCase();
+            for (const submitText of submitTexts) {
+                if (text.includes(submitText)) {
+                    console.log("Found submit button by text:", text);
+                    button.click();
+                    return "Clicked button with text: " + text;
+                }
+            }
+        }
+
+        // Try looking for buttons below the emojis
+        let emojiBottom = 0;
+        let feedbackContainer = null;
+
+        // Find the feedback container
+        document.querySelectorAll('div, section, form').forEach(container => {
+            const text = (container.innerText || container.textContent || '').toLowerCase();
+            if (text.includes('how was') || text.includes('feedback') || text.includes('rate')) {
+                feedbackContainer = container;
+            }
+        });
+
+        if (feedbackContainer) {
+            // Look for buttons inside the feedback container
+            const containerButtons = Array.from(feedbackContainer.querySelectorAll('button'));
+
+            // Sort by vertical position (top to bottom)
+            containerButtons.sort((a, b) => {
+                const rectA = a.getBoundingClientRect();
+                const rectB = b.getBoundingClientRect();
+                return rectA.top - rectB.top;
+            });
+
+            // The submit button is likely the last button in the container
+            if (containerButtons.length > 0) {
+                const lastButton = containerButtons[containerButtons.length - 1];
+                lastButton.click();
+                return "Clicked last button in feedback container";
+            }
+        }
+
+        // Last resort: find the most prominent button on the page
+        const visibleButtons = Array.from(buttons).filter(b => 
+            b.offsetHeight > 0 && b.offsetWidth > 0 && 
+            window.getComputedStyle(b).display !== 'none' && 
+            window.getComputedStyle(b).visibility !== 'hidden'
+        );
+
+        // Sort by prominence (size, styling)
+        visibleButtons.sort((a, b) => {
+            const aStyle = window.getComputedStyle(a);
+            const bStyle = window.getComputedStyle(b);
+
+            // Score based on size, color, border, etc.
+            const aScore = 
+                (a.offsetWidth * a.offsetHeight) +
+                (aStyle.backgroundColor !== 'rgba(0, 0, 0, 0)' ? 1000 : 0) +
+                (aStyle.borderWidth !== '0px' ? 500 : 0) +
+                (aStyle.fontWeight === 'bold' ? 300 : 0);
+
+            const bScore = 
+                (b.offsetWidth * b.offsetHeight) +
+                (bStyle.backgroundColor !== 'rgba(0, 0, 0, 0)' ? 1000 : 0) +
+                (bStyle.borderWidth !== '0px' ? 500 : 0) +
+                (bStyle.fontWeight === 'bold' ? 300 : 0);
+
+            return bScore - aScore; // Higher score first
+        });
+
+        if (visibleButtons.length > 0) {
+            visibleButtons[0].click();
+            return "Clicked most prominent button";
+        }
+
+        return false;
+    };
+
+    // One look at the page: which step of the flow is it on? Every text question is
+    // answered by a single text index pass; texts maps each state to its phrases
+    detectors.classify = function (texts, cameraButtonXPath, presentIndicatorXPath, attendanceXPath) {
+        function result(state, evidence) {
+            const page = {state: state, evidence: evidence, url: location.href.slice(0, 200)};
+            if (state === 'dashboard') page.attendanceButton = !!findClickable('xpath', attendanceXPath, null);
+            return page;
+        }
+        if (/(^|\.)accounts\.google\.com$/.test(location.hostname)) {
+            return result('google_sign_in', location.hostname);
+        }
+        if (document.readyState === 'loading' || !document.body) {
+            return result('loading', 'document ' + document.readyState);
+        }
+
+        const phrases = [].concat.apply([], Object.values(texts));
+        const found = detectors.texts(phrases);
+        function visible(state) {
+            return texts[state].find(phrase => found[phrase] && found[phrase].visible);
+        }
+        function shown(el) {
+            if (!el) return false;
+            const rect = el.getBoundingClientRect();
+            return rect.width > 0 && rect.height > 0;
+        }
+
+        let hit;
+        // A modal over the dashboard has to be dealt with before anything behind it
+        if ((hit = visible('feedback_dialog'))) return result('feedback_dialog', hit);
+        if ((hit = visible('confirmation'))) return result('confirmation', hit);
+        const video = Array.from(document.querySelectorAll('video')).find(shown);
+        if (video) return result('camera', 'video');
+        if (findClickable('xpath', cameraButtonXPath, null)) return result('camera', "I'm Present button");
+        if ((hit = visible('already_present'))) return result('already_present', hit);
+        const indicator = document.evaluate(presentIndicatorXPath, document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        if (shown(indicator)) return result('already_present', (indicator.textContent || '').trim().slice(0, 80));
+        if ((hit = visible('dashboard'))) return result('dashboard', hit);
+        if ((hit = visible('login_page'))) return result('login_page', hit);
+        return result('unknown', document.title);
+    };
+
+    detectors.googleButton = function () {
+        // Try to find the Google button
+        const buttons = Array.from(document.querySelectorAll('button, a, div[role="button"]'));
+
+        // First look for buttons containing "Google" text
+        for (const btn of buttons) {
+            const text = (btn.innerText || btn.textContent || '').toLowerCase();
+            if (text.includes('google')) {
+                console.log('Found Google button by text:', text);
+                remember(btn).click();
+                return "Clicked Google button by text";
+            }
+        }
+
+        // Then look for buttons with Google images
+        for (const btn of buttons) {
+            const images = btn.querySelectorAll('img');
+            for (const img of images) {
+                const src = img.src || '';
+                const alt = img.alt || '';
+                if (src.includes('google') || alt.includes('google')) {
+                    console.log('Found Google button by image');
+                    remember(btn).click();
+                    return "Clicked Google button by image";
+                }
+            }
+        }
+
+        // Look for any OAuth or SSO provider buttons
+        for (const btn of buttons) {
+            if (btn.className.includes('oauth') || 
+                btn.className.includes('provider') || 
+                btn.className.includes('social') ||
+                btn.id.includes('google') ||
+                btn.getAttribute('data-provider') === 'google') {
+                console.log('Found Google button by class/attribute');
+                remember(btn).click();
+                return "Clicked Google button by class/attribute";
+            }
+        }
+
+        return false;
+    };
+
+    detectors.attendanceButton = function () {
+        // Look for any element with attendance text
+        const allElements = document.querySelectorAll('*');
+        for (const elem of allElements) {
+            const text = (elem.innerText || elem.textContent || '').toLowerCase();
+            if (text.includes('attendance') || text.includes('mark attendance')) {
+                console.log('Found element with attendance text:', elem.tagName, text);
+
+                // If it's directly clickable
+                if (elem.tagName === 'BUTTON' || elem.tagName === 'A' || 
+                    elem.role === 'button' || elem.getAttribute('role') === 'button') {
+                    remember(elem).click();
+                    return "Clicked direct element: " + elem.tagName + " - " + text;
+                }
+
+                // Check parents for clickable elements
+                let parent = elem.parentElement;
+                let level = 0;
+                while (parent && level < 5) {
+                    if (parent.tagName === 'BUTTON' || parent.tagName === 'A' || 
+                        parent.onclick || parent.role === 'button' || 
+                        parent.getAttribute('role') === 'button' ||
+                        window.getComputedStyle(parent).cursor === 'pointer') {
+                        remember(parent).click();
+                        return "Clicked parent: " + parent.tagName + " - level " + level;
+                    }
+                    parent = parent.parentElement;
+                    level++;
+                }
+
+                // Check children for clickable elements
+                const clickableChildren = elem.querySelectorAll('button, a, [role="button"]');
+                if (clickableChildren.length > 0) {
+                    remember(clickableChildren[0]).click();
+                    return "Clicked child: " + clickableChildren[0].tagName;
+                }
+
+                // Force click as last resort
+                try {
+                    remember(elem).click();
+                    return "Force-clicked: " + elem.tagName + " - " + text;
+                } catch (e) {
+                    console.log("Failed to click:", e);
+                }
+            }
+        }
+
+        // Last resort - look for prominent buttons
+        const prominentButtons = Array.from(document.querySelectorAll('button')).filter(b => 
+            b.offsetHeight > 0 && b.offsetWidth > 0 && (
+                b.className.includes('primary') || 
+                b.className.includes('action') ||
+                b.offsetWidth > 150 ||
+                b.style.fontSize > '16px'
+            )
+        );
+
+        if (prominentButtons.length > 0) {
+            remember(prominentButtons[0]).click();
+            return "Clicked prominent button: " + (prominentButtons[0].innerText || prominentButtons[0].textContent);
+        }
+
+        return false;
+    };
+
+    detectors.presentButton = function () {
+        // Aggressive Present button finder and clicker (retried on every poll from Python)
+        // Direct button text search
+        const buttons = document.querySelectorAll('button');
+        for (const button of buttons) {
+            const text = (button.innerText || button.textContent || '').toLowerCase();
+            if (text.includes('present') || text.includes("i'm present") || 
+                text.includes('confirm') || text.includes('submit')) {
+                remember(button).click();
+                return "Clicked button: " + text;
+            }
+        }
+
+        // Visible buttons
+        const visibleButtons = Array.from(buttons).filter(b => 
+            b.offsetHeight > 0 && b.offsetWidth > 0 && 
+            window.getComputedStyle(b).display !== 'none' && 
+            window.getComputedStyle(b).visibility !== 'hidden'
+        );
+
+        // Primary/action buttons
+        for (const button of visibleButtons) {
+            if (button.className.toLowerCase().includes('primary') || 
+                button.className.toLowerCase().includes('action') ||
+                button.className.toLowerCase().includes('submit') ||
+                button.className.toLowerCase().includes('confirm') ||
+                window.getComputedStyle(button).backgroundColor !== 'rgba(0, 0, 0, 0)') {
+                remember(button).click();
+                return "Clicked primary style button: " + button.className;
+            }
+        }
+
+        // Last resort - click the largest visible button
+        if (visibleButtons.length > 0) {
+            visibleButtons.sort((a, b) => 
+                (b.offsetWidth * b.offsetHeight) - (a.offsetWidth * a.offsetHeight)
+            );
+            remember(visibleButtons[0]).click();
+            return "Clicked largest button";
+        }
+
+        return false;
+    };
+
+    window.__kal = {
+        version: 1,
+        detect: function (name) {
+            return detectors[name].apply(null, Array.prototype.slice.call(arguments, 1));
+        }
+    };
+})();
+"""
+#######################################################
+
+def install_page_library(driver):
+    """Register the page library so Chrome evaluates it in every new document"""
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": PAGE_LIBRARY_JS})
+        logger.info("Page library registered for new documents")
+    except Exception as e:
+        logger.warning(f"Could not register page library via CDP, will inject on demand: {e}")
+
+def kal(driver, name, *args):
+    """Run a page library detector, i.e. window.__kal.detect(name, *args)"""
+    call = "return window.__kal ? {value: window.__kal.detect.apply(null, arguments)} : null;"
+    result = driver.execute_script(call, name, *args)
+    if result is None:
+        # Document predates the registration (or CDP is unavailable) - inject once
+        driver.execute_script(PAGE_LIBRARY_JS)
+        result = driver.execute_script(call, name, *args)
+    return result["value"]
+
+def kal_async(driver, name, *args):
+    """Await a page library detector that returns a Promise, via execute_async_script"""
+    call = ("const done = arguments[arguments.length - 1];"
+            "if (!window.__kal) { done(null); return; }"
+            "Promise.resolve(window.__kal.detect.apply(null, Array.prototype.slice.call(arguments, 0, -1)))"
+            ".then(value => done({value: value}), error => done({error: String(error)}));")
+    result = driver.execute_async_script(call, name, *args)
+    if result is None:
+        driver.execute_script(PAGE_LIBRARY_JS)
+        result = driver.execute_async_script(call, name, *args)
+    if "error" in result:
+        raise WebDriverException(f"__kal.{name} failed: {result['error']}")
+    return result["value"]
+
+def find_texts(driver, phrases):
+    """Look up phrases in the page text index; returns {phrase: {"visible", "snippet"} or None}"""
+    return kal(driver, "texts", [phrase.lower() for phrase in phrases])
+
+def first_visible_text(driver, phrases):
+    """Return (phrase, snippet) of the first phrase visible on the page, or None"""
+    results = find_texts(driver, phrases)
+    for phrase in phrases:
+        match = results.get(phrase.lower())
+        if match and match["visible"]:
+            return phrase, match["snippet"]
+    return None
+
+#######################################################
+# Screenshot pipeline - CDP capture, encoding/writing on a worker thread
+# into the deduplicating store in logs/artifacts/ (see artifacts.py)
+#######################################################
+SCREENSHOT_SCALE = 0.5      # 1.0 = full resolution
+SCREENSHOT_FORMAT = "jpeg"  # "png", "jpeg" or "webp"
+SCREENSHOT_QUALITY = 70     # jpeg/webp only
+# Stages captured as a compressed text snapshot (visible text + buttons, see __kal
+# textSnapshot) instead of a screenshot; matched by stage name prefix
+TEXT_SNAPSHOT_STAGES = ("state_", "after_google_button_search")
+TEXT_SNAPSHOT_MAX_ITEMS = 400       # Text nodes / buttons per snapshot
+TEXT_SNAPSHOT_MAX_CHARS = 200       # Per text node or label
+# Flight recorder: keep recent frames in memory, write them (and the DOM of the page
+# the run failed on) only when a run fails
+FLIGHT_RECORDER = True
+FLIGHT_RECORDER_MAX_FRAMES = 20
+FLIGHT_RECORDER_MAX_BYTES = 20 * 1024 * 1024
+FLIGHT_RECORDER_DOM_CHARS = 256 * 1024
+#######################################################
+
+artifact_store = artifacts.open_store(log_directory)
+_screenshot_queue = queue.Queue()
+_screenshot_worker = None
+_flight_recorder = collections.deque()
+_flight_recorder_bytes = 0
+
+def _screenshot_writer():
+    """Worker thread: write queued artifacts into the content-addressed store under logs/artifacts/"""
+    while True:
+        artifact = _screenshot_queue.get()
+        try:
+            artifact_store.put(artifact["data"], artifact["run"], artifact["stage"], artifact["extension"],
+                               at=artifact["at"], digest=artifact["digest"])
+        except Exception as e:
+            logger.error(f"Failed to store {artifact['stage']} artifact: {e}")
+        finally:
+            _screenshot_queue.task_done()
+
+def _make_artifact(stage, extension, data):
+    """Artifact record for a base64 frame (or raw bytes); the blob path is known before it's written"""
+    data = data if isinstance(data, bytes) else base64.b64decode(data)
+    digest, path = artifact_store.prepare(data, extension)
+    return {"stage": stage, "extension": extension, "data": data, "digest": digest, "path": path,
+            "run": _span_state["run"] or "adhoc", "at": datetime.now()}
+
+def _queue_screenshot(artifact):
+    """Hand an artifact to the writer thread, starting it on first use"""
+    global _screenshot_worker
+    if _screenshot_worker is None:
+        _screenshot_worker = threading.Thread(target=_screenshot_writer, name="screenshot-writer", daemon=True)
+        _screenshot_worker.start()
+    _screenshot_queue.put(artifact)
+
+def capture_screenshot(driver, stage, element=None):
+    """Grab a downscaled frame (optionally clipped to element) and queue it; returns its blob path or None
+
+    Stages listed in TEXT_SNAPSHOT_STAGES get a text snapshot instead (unless clipped to an element).
+    """
+    if element is None and stage.startswith(TEXT_SNAPSHOT_STAGES):
+        return capture_text_snapshot(driver, stage)
+    extension = "jpg" if SCREENSHOT_FORMAT == "jpeg" else SCREENSHOT_FORMAT
+    try:
+        params = {"format": SCREENSHOT_FORMAT}
+        if SCREENSHOT_FORMAT != "png":
+            params["quality"] = SCREENSHOT_QUALITY
+        if element is not None:
+            rect = element.rect
+            params["clip"] = {"x": rect["x"], "y": rect["y"], "width": rect["width"],
+                              "height": rect["height"], "scale": SCREENSHOT_SCALE}
+        elif SCREENSHOT_SCALE != 1.0:
+            viewport = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})["cssVisualViewport"]
+            params["clip"] = {"x": viewport["pageX"], "y": viewport["pageY"],
+                              "width": viewport["clientWidth"], "height": viewport["clientHeight"],
+                              "scale": SCREENSHOT_SCALE}
+        data = driver.execute_cdp_cmd("Page.captureScreenshot", params)["data"]
+    except Exception as e:
+        logger.warning(f"CDP capture failed for {stage}, falling back to WebDriver PNG: {e}")
+        try:
+            extension = "png"
+            data = driver.get_screenshot_as_base64()
+        except Exception as e:
+            logger.error(f"Failed to capture {stage} screenshot: {e}")
+            return None
+    artifact = _make_artifact(stage, extension, data)
+    if FLIGHT_RECORDER:
+        _record_frame(artifact)
+    else:
+        _queue_screenshot(artifact)
+    return artifact["path"]
+
+def capture_text_snapshot(driver, stage):
+    """Capture visible text, buttons, URL and title as gzipped JSON and queue it; returns its blob path or None"""
+    try:
+        snapshot = kal(driver, "textSnapshot", TEXT_SNAPSHOT_MAX_ITEMS, TEXT_SNAPSHOT_MAX_CHARS)
+    except Exception as e:
+        logger.error(f"Failed to capture {stage} text snapshot: {e}")
+        return None
+    # mtime=0 keeps identical snapshots byte-identical, so the store deduplicates them
+    data = gzip.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"), mtime=0)
+    artifact = _make_artifact(stage, "json.gz", data)
+    if FLIGHT_RECORDER:
+        _record_frame(artifact)
+    else:
+        _queue_screenshot(artifact)
+    return artifact["path"]
+
+def _record_frame(artifact):
+    """Push a frame into the flight recorder ring buffer (no browser round trip)"""
+    global _flight_recorder_bytes
+    _flight_recorder.append(artifact)
+    _flight_recorder_bytes += len(artifact["data"])
+    while _flight_recorder and (len(_flight_recorder) > FLIGHT_RECORDER_MAX_FRAMES or
+                                _flight_recorder_bytes > FLIGHT_RECORDER_MAX_BYTES):
+        _flight_recorder_bytes -= len(_flight_recorder.popleft()["data"])
+
+def clear_flight_recorder():
+    """Drop every buffered frame without writing it"""
+    global _flight_recorder_bytes
+    _flight_recorder.clear()
+    _flight_recorder_bytes = 0
+
+def flush_flight_recorder(reason, driver=None):
+    """Persist everything in the flight recorder (called when a phase or the run fails),
+    plus a bounded DOM snapshot of the page driver is on now"""
+    global _flight_recorder_bytes
+    if not _flight_recorder:
+        return
+    logger.info(f"Flight recorder: writing {len(_flight_recorder)} frames ({reason})")
+    while _flight_recorder:
+        _queue_screenshot(_flight_recorder.popleft())
+    _flight_recorder_bytes = 0
+    if driver is not None:
+        try:
+            dom = kal(driver, "domSnapshot", FLIGHT_RECORDER_DOM_CHARS)
+        except Exception as e:
+            dom = f"<!-- DOM snapshot failed: {e} -->"
+        _queue_screenshot(_make_artifact("failure_dom", "html", dom.encode("utf-8")))
+
+def flush_screenshots():
+    """Block until every queued screenshot has been written"""
+    _screenshot_queue.join()
+
+# Page texts and locators shared by the phases and their wait conditions
+DASHBOARD_TEXTS = ("My Day", "Squad", "Announcements", "Mark Attendance")
+FEEDBACK_TEXTS = ("how was the session", "how was your session", "rate the session")
+SUCCESS_TEXTS = ("success", "thank you", "marked as present", "attendance confirmed")
+GOOGLE_BUTTON_XPATH = "//button[contains(., 'Google')]"
+GOOGLE_ICON_CSS = "button img[alt*='Google'], button img[src*='google']"
+ATTENDANCE_BUTTON_XPATH = (
+    "//button[contains(text(), 'Attendance') or contains(text(), 'attendance')] | "
+    "//a[contains(text(), 'Attendance') or contains(text(), 'attendance')] | "
+    "//button[contains(text(), 'Mark') or contains(text(), 'mark')] | "
+    "//a[contains(text(), 'Mark') or contains(text(), 'mark')]"
+)
+PRESENT_BUTTON_XPATH = (
+    "//button[contains(text(), 'Present') or contains(text(), 'present')] | "
+    "//button[contains(text(), \"I'm\") and contains(text(), 'Present')] | "
+    "//button[contains(text(), 'Confirm') or contains(text(), 'confirm')] | "
+    "//button[contains(text(), 'Submit') or contains(text(), 'submit')]"
+)
+# Only on the camera screen - unlike PRESENT_BUTTON_XPATH, which also takes any Submit/Confirm
+CAMERA_BUTTON_XPATH = (
+    "//button[contains(translate(., 'IMPRESNT', 'impresnt'), \"i'm present\") or "
+    "contains(translate(., 'IAMPRESNT', 'iampresnt'), 'i am present')]"
+)
+SUBMIT_BUTTON_XPATH = (
+    "//button[contains(translate(., 'SUBMITOKDNE', 'submitokdne'), 'submit') or "
+    "contains(translate(., 'SUBMITOKDNE', 'submitokdne'), 'done')]"
+)
+PRESENT_INDICATOR_XPATH = (
+    "//div[contains(text(), 'Present')] | "
+    "//span[contains(text(), 'Present')] | "
+    "//div[contains(text(), \"You're marked as present\")]"
+)
+LOGIN_TEXTS = ("continue with google", "sign in with google", "sign in", "log in")
+CONFIRMATION_TEXTS = ("yay! you", "attendance confirmed")
+ALREADY_PRESENT_TEXTS = ("you're marked as present", "already marked", "marked as present", "stay focussed")
+CAMERA_SCREEN_CONDITIONS = (
+    element_visible(By.TAG_NAME, "video"),
+    element_visible(By.XPATH, CAMERA_BUTTON_XPATH),
+)
+
+#######################################################
+# Strategy cache - per site, which approach (and element) won recently
+#######################################################
+STRATEGY_CACHE_FILE = os.path.join(state_directory, "strategy_cache.json")
+STRATEGY_HALF_LIFE_DAYS = 7     # Wins and failures count half as much after this long
+STRATEGY_FAILURE_WEIGHT = 0.5   # A win earns 1; a race nobody won costs every strategy this much
+STRATEGY_MIN_SCORE = 0.05       # Entries that decayed below this are forgotten
+# Catch-all "detector" strategies only join the race once the precise locators have
+# had their phase deadline, and then get this many seconds
+DETECTOR_FALLBACK_SECONDS = 3
+#######################################################
+
+def _load_strategy_cache():
+    try:
+        with open(STRATEGY_CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_strategy_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(STRATEGY_CACHE_FILE), exist_ok=True)
+        temp_path = f"{STRATEGY_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(temp_path, STRATEGY_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Could not save strategy cache: {e}")
+
+def _decayed_score(entry, now):
+    age_days = max(0.0, now - entry["updated"]) / 86400
+    return entry["score"] * 0.5 ** (age_days / STRATEGY_HALF_LIFE_DAYS)
+
+def _strategy_entries(cache, phase):
+    site = urllib.parse.urlparse(KALVIUM_URL).netloc
+    return cache.setdefault(site, {}).setdefault(phase, {})
+
+def _record_strategy(entries, name, won, locator=None, now=None):
+    """Decay the entry to now, then credit a win (keeping its locator) or charge a failure"""
+    now = now or time.time()
+    entry = entries.get(name, {"score": 0.0, "updated": now, "locator": None})
+    entry["score"] = _decayed_score(entry, now) + (1.0 if won else -STRATEGY_FAILURE_WEIGHT)
+    entry["updated"] = now
+    if won:
+        entry["locator"] = locator
+    if abs(entry["score"]) < STRATEGY_MIN_SCORE and not entry["locator"]:
+        entries.pop(name, None)
+    else:
+        entries[name] = entry
+
+def run_strategies(driver, phase, label, strategies, expected_text, wait_phase, verify, verify_phase,
+                   done_texts=()):
+    """Race (name, kind, selector) strategies in one poll loop; returns the winning match or None.
+
+    Every poll checks all strategies in a single page call (__kal clickFirst) and clicks
+    the first that matches, so detection takes as long as the fastest strategy rather
+    than the sum of the failing ones. Recent winners are checked first, led by the
+    historical winner's cached locator (validated by visibility and expected text).
+    Catch-all detector strategies are held back until the precise ones have had
+    wait_phase's deadline. done_texts, checked after every strategy, end the race with
+    nothing clicked if any of them is visible. The match
+    is {"name", "locator", "result", "verified"}, named "cached locator" / "done" in
+    those cases. A click only counts as a win once one of the `verify` conditions holds
+    within verify_phase's deadline; otherwise the strategy is charged a failure and its
+    locator forgotten, so a wrong click is never learned.
+    """
+    cache = _load_strategy_cache()
+    entries = _strategy_entries(cache, phase)
+    now = time.time()
+    scores = {name: _decayed_score(entries[name], now) if name in entries else 0.0 for name, _, _ in strategies}
+    # Stable sort: without history the original order is kept
+    ordered = sorted(strategies, key=lambda strategy: -scores[strategy[0]])
+    candidates = [[name, kind, selector, None] for name, kind, selector in ordered]
+
+    best_name = ordered[0][0]
+    cached = entries.get(best_name, {}).get("locator")
+    if cached and scores[best_name] > 0:
+        candidates.insert(0, ["cached locator", cached[0], cached[1], expected_text])
+    if done_texts:
+        candidates.append(["done", "text", [text.lower() for text in done_texts], None])
+
+    # Precise locators first; a detector matching on page text alone could click the
+    # wrong thing before the real button has rendered
+    precise = [candidate for candidate in candidates if candidate[1] != "detector"]
+    match = wait_for(driver, wait_phase, first_match(precise))
+    if match is None and len(precise) < len(candidates):
+        logger.info(f"{label}: precise locators found nothing, trying the JavaScript detectors")
+        match = wait_for(driver, wait_phase, first_match(candidates), timeout=DETECTOR_FALLBACK_SECONDS)
+    if match is None:
+        for name, _, _ in ordered:
+            _record_strategy(entries, name, False, None, now)
+    elif match["name"] == "done":
+        logger.info(f"{label}: the page already shows the step as done")
+        match["verified"] = True
+    else:
+        if match["name"] == "cached locator":
+            name, locator = best_name, cached
+            logger.info(f"Cached {label} locator from {best_name} still valid: {cached[1]}")
+            set_strategy(f"{best_name} (cached locator)")
+        else:
+            name, locator = match["name"], match["locator"]
+            if cached and name != best_name:
+                logger.info(f"Cached {best_name} locator is stale: {cached[1]}")
+                entries[best_name]["locator"] = None
+            set_strategy(name)
+        match["verified"] = wait_for(driver, verify_phase, *verify) is not None
+        if match["verified"]:
+            _record_strategy(entries, name, True, locator, now)
+        else:
+            logger.warning(f"{label} click by {name} had no effect; not counting it as a win")
+            _record_strategy(entries, name, False, None, now)
+            if name in entries:
+                entries[name]["locator"] = None
+
+    _save_strategy_cache(cache)
+    return match
+
+#######################################################
+# Profile cleanup - only the Chrome instance holding our profile is closed
+#######################################################
+PROFILE_RELEASE_TIMEOUT = 5  # Seconds to wait after terminate, and again after kill
+CHROME_PROCESS_NAMES = ("chrome.exe", "chrome", "google-chrome", "chromium", "chromium-browser", "google chrome")
+# Where Chrome keeps its profiles when started without --user-data-dir
+DEFAULT_USER_DATA_DIRS = [
+    os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "Google", "Chrome", "User Data"),
+    os.path.expanduser(os.path.join("~", "Library", "Application Support", "Google", "Chrome")),
+    os.path.expanduser(os.path.join("~", ".config", "google-chrome")),
+    os.path.expanduser(os.path.join("~", ".config", "chromium")),
+]
+#######################################################
+
+def _same_path(a, b):
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+def _profile_lock_pid(user_data_dir):
+    """PID recorded in Chrome's SingletonLock symlink ("<host>-<pid>", POSIX only)"""
+    try:
+        target = os.readlink(os.path.join(user_data_dir, "SingletonLock"))
+    except (OSError, AttributeError, NotImplementedError):
+        return None
+    match = re.search(r"-(\d+)$", target)
+    return int(match.group(1)) if match else None
+
+def is_profile_locked(user_data_dir):
+    """True while a running Chrome holds the profile's singleton lock"""
+    if os.name == "nt":
+        # Chrome keeps "lockfile" open without sharing while it owns the profile
+        lock_path = os.path.join(user_data_dir, "lockfile")
+        if not os.path.exists(lock_path):
+            return False
+        try:
+            with open(lock_path, "a"):
+                return False
+        except PermissionError:
+            return True
+        except OSError:
+            return False
+    pid = _profile_lock_pid(user_data_dir)
+    return pid is not None and psutil.pid_exists(pid)
+
+def _is_chrome(proc):
+    return (proc.info['name'] or "").lower() in CHROME_PROCESS_NAMES
+
+def find_profile_processes(user_data_dir):
+    """Processes started with --user-data-dir=<user_data_dir> or owning its lock.
+
+    For Chrome's default profile location, a normally opened Chrome has no
+    --user-data-dir at all, so its browser process (the one without --type=) counts too.
+    """
+    lock_pid = _profile_lock_pid(user_data_dir)
+    is_default = any(_same_path(user_data_dir, path) for path in DEFAULT_USER_DATA_DIRS)
+    matches = []
+    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+        cmdline = proc.info['cmdline'] or []
+        if proc.info['pid'] == lock_pid:
+            matches.append(proc)
+            continue
+        data_dirs = [arg.split("=", 1)[1].strip('"') for arg in cmdline if arg.startswith("--user-data-dir=")]
+        if any(_same_path(path, user_data_dir) for path in data_dirs):
+            matches.append(proc)
+        elif is_default and not data_dirs and _is_chrome(proc) and \
+                not any(arg.startswith("--type=") for arg in cmdline):
+            matches.append(proc)
+    if not matches and os.name == "nt" and is_profile_locked(user_data_dir):
+        # Last resort: whoever has the lockfile open
+        lock_path = os.path.join(user_data_dir, "lockfile")
+        for proc in psutil.process_iter(['pid', 'name']):
+            if not _is_chrome(proc):
+                continue
+            try:
+                if any(_same_path(f.path, lock_path) for f in proc.open_files()):
+                    matches.append(proc)
+            except psutil.Error:
+                pass
+    return matches
+
+def kill_chrome_processes(user_data_dir=None):
+    """Close the Chrome processes holding our profile lock; other Chrome sessions are left alone"""
+    user_data_dir = user_data_dir or CHROME_USER_DATA_DIR
+    processes = find_profile_processes(user_data_dir)
+    if not processes:
+        if is_profile_locked(user_data_dir):
+            raise RuntimeError(f"The Chrome profile {user_data_dir} is locked by a process that could not be "
+                               "identified; close Chrome and try again")
+        logger.info("No Chrome instance is using the profile")
+        return
+    try:
+        
+        logger.info(f"Closing {len(processes)} Chrome processes using {user_data_dir}...")
+        for proc in processes:
+            try:
+                proc.terminate()
+            except psutil.NoSuchProcess:
+                pass
+            except psutil.Error as e:
+                logger.warning(f"Failed to terminate process {proc.pid}: {e}")
+        
+        # Returns as soon as every process has exited
+        _, alive = psutil.wait_procs(processes, timeout=PROFILE_RELEASE_TIMEOUT)
+        if alive:
+            logger.warning(f"{len(alive)} Chrome processes ignored terminate, killing them")
+            for proc in alive:
+                try:
+                    proc.kill()
+                except psutil.Error:
+                    pass
+            psutil.wait_procs(alive, timeout=PROFILE_RELEASE_TIMEOUT)
+        
+        if poll_until(lambda: not is_profile_locked(user_data_dir), PROFILE_RELEASE_TIMEOUT) is None:
+            logger.warning("Profile lock is still held after closing Chrome")
+        else:
+            logger.info("Chrome processes terminated; profile lock released.")
+    except Exception as e:
+        logger.error(f"Error while closing Chrome processes: {e}")
+
+#######################################################
+# ChromeDriver resolution - offline, pinned to the installed Chrome version
+#######################################################
+DRIVER_CACHE_FILE = os.path.join(state_directory, "driver_cache.json")
+DRIVER_SEARCH_DIRS = [
+    os.path.join(os.path.expanduser("~"), ".wdm", "drivers", "chromedriver"),
+    script_directory,
+]
+DRIVER_BINARY_NAMES = ("chromedriver.exe", "chromedriver")
+# SessionNotCreatedException messages that mean the cached driver doesn't fit this Chrome
+DRIVER_MISMATCH_RE = re.compile(r"only supports Chrome version|Current browser version is|"
+                                r"version of ChromeDriver", re.IGNORECASE)
+#######################################################
+
+_resolved_driver = {}
+
+def get_chrome_version():
+    """Return the installed Chrome version string (e.g. '135.0.7049.95'), or None"""
+    if "chrome_version" in _resolved_driver:
+        return _resolved_driver["chrome_version"]
+    version = None
+    if os.name == "nt":
+        import winreg
+        for hive in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+            try:
+                with winreg.OpenKey(hive, r"Software\Google\Chrome\BLBeacon") as key:
+                    version = winreg.QueryValueEx(key, "version")[0]
+                    break
+            except OSError:
+                continue
+    else:
+        for binary in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser",
+                       "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"):
+            try:
+                output = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=5).stdout
+            except (OSError, subprocess.SubprocessError):
+                continue
+            match = re.search(r"\d+(\.\d+)+", output)
+            if match:
+                version = match.group(0)
+                break
+    _resolved_driver["chrome_version"] = version
+    return version
+
+def _driver_version(path):
+    """Ask a chromedriver binary for its version"""
+    try:
+        output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"\d+(\.\d+)+", output)
+    return match.group(0) if match else None
+
+def _find_cached_driver(major):
+    """Scan the on-disk driver caches for a chromedriver whose major version matches"""
+    for search_dir in DRIVER_SEARCH_DIRS:
+        if not os.path.isdir(search_dir):
+            continue
+        for root, dirs, files in os.walk(search_dir):
+            # Don't descend into logs/state or other unrelated trees next to the script
+            if root == script_directory:
+                dirs[:] = []
+            for name in DRIVER_BINARY_NAMES:
+                if name not in files:
+                    continue
+                path = os.path.join(root, name)
+                # webdriver-manager keeps binaries under a <version> directory
+                version = next((part for part in root.split(os.sep) if re.match(r"^\d+\.\d+", part)), None)
+                version = version or _driver_version(path)
+                if version and (major is None or version.split(".")[0] == major):
+                    return path, version
+    return None, None
+
+def _load_driver_cache():
+    try:
+        with open(DRIVER_CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_driver_cache(cache):
+    try:
+        os.makedirs(state_directory, exist_ok=True)
+        with open(DRIVER_CACHE_FILE, "w") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        logger.warning(f"Could not save driver cache: {e}")
+
+def resolve_chromedriver(refresh=False):
+    """Return a chromedriver path for the installed Chrome; only downloads on a version mismatch"""
+    if not refresh and "path" in _resolved_driver:
+        return _resolved_driver["path"]
+
+    chrome_version = get_chrome_version()
+    major = chrome_version.split(".")[0] if chrome_version else None
+    cache = _load_driver_cache()
+    key = major or "unknown"
+    entry = cache.get(key)
+    path = None
+
+    if not refresh and entry and os.path.exists(entry["path"]):
+        path = entry["path"]
+        logger.info(f"Using cached ChromeDriver {entry['version']} for Chrome {chrome_version}")
+    if path is None and not refresh:
+        path, version = _find_cached_driver(major)
+        if path:
+            logger.info(f"Found ChromeDriver {version} on disk for Chrome {chrome_version}")
+            cache[key] = {"path": path, "version": version}
+    if path is None:
+        # Real mismatch (or nothing on disk) - the only case that touches the network
+        logger.info(f"No usable ChromeDriver for Chrome {chrome_version}, downloading...")
+        path = ChromeDriverManager().install()
+        cache[key] = {"path": path, "version": _driver_version(path) or chrome_version}
+
+    _save_driver_cache(cache)
+    _resolved_driver["path"] = path
+    return path
+
+#######################################################
+# Lean navigation - eager page loads, heavy third-party resources blocked
+#######################################################
+LEAN_NAVIGATION = True
+# URLPattern syntax (https://urlpattern.spec.whatwg.org/); allow entries win over block entries
+ALLOWED_URL_PATTERNS = [
+    "*://accounts.google.com/*",   # Google sign-in must render fully
+    "*://*gstatic.com/*",          # ... including its scripts and sprites
+    "*://*:*/*google*",            # Google icon that the login detectors look for
+    "*://*:*/*emoji*",             # Feedback dialog emoji, when they are images
+]
+BLOCKED_URL_PATTERNS = [
+    "*://*:*/*.png", "*://*:*/*.jpg", "*://*:*/*.jpeg", "*://*:*/*.gif", "*://*:*/*.webp", "*://*:*/*.avif",
+    "*://*:*/*.ico", "*://*:*/*.mp4", "*://*:*/*.webm", "*://*:*/*.mp3",
+    "*://*:*/*.woff", "*://*:*/*.woff2", "*://*:*/*.ttf", "*://*:*/*.otf",
+    "*://*google-analytics.com/*", "*://*googletagmanager.com/*", "*://*doubleclick.net/*",
+    "*://*hotjar.com/*", "*://*clarity.ms/*", "*://*facebook.net/*", "*://*segment.io/*",
+    "*://*mixpanel.com/*", "*://*sentry.io/*", "*://*intercom.io/*",
+]
+# Typical transfer size per blocked resource type, for the "bytes saved" estimate
+BLOCKED_BYTES_ESTIMATE = {"Image": 40_000, "Media": 500_000, "Font": 35_000, "Script": 60_000}
+BLOCKED_BYTES_DEFAULT = 10_000
+#######################################################
+
+def _legacy_url_pattern(pattern):
+    """'*://*:*/*.png' -> '**/*.png' for Chrome versions that only take wildcard `urls`"""
+    return "*" + pattern.split("://", 1)[1].replace("*:*/", "*/", 1)
+
+def enable_lean_navigation(driver):
+    """Block BLOCKED_URL_PATTERNS (minus the allow-list) in the current tab via CDP"""
+    if not LEAN_NAVIGATION:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        try:
+            patterns = ([{"urlPattern": pattern, "block": False} for pattern in ALLOWED_URL_PATTERNS] +
+                        [{"urlPattern": pattern, "block": True} for pattern in BLOCKED_URL_PATTERNS])
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urlPatterns": patterns})
+            logger.info(f"Lean navigation: blocking {len(BLOCKED_URL_PATTERNS)} patterns, "
+                        f"allowing {len(ALLOWED_URL_PATTERNS)}")
+        except WebDriverException:
+            # Older Chrome: wildcard `urls` only, which has no allow entries
+            driver.execute_cdp_cmd("Network.setBlockedURLs",
+                                   {"urls": [_legacy_url_pattern(pattern) for pattern in BLOCKED_URL_PATTERNS]})
+            logger.info(f"Lean navigation: blocking {len(BLOCKED_URL_PATTERNS)} patterns (no allow-list support)")
+    except Exception as e:
+        logger.warning(f"Could not enable lean navigation, loading everything: {e}")
+
+def log_blocked_savings(driver):
+    """Summarize the requests lean navigation blocked, from Chrome's performance log"""
+    if not LEAN_NAVIGATION:
+        return
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        logger.info(f"Lean navigation: no performance log to estimate savings ({e})")
+        return
+    blocked = collections.Counter()
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        if message["method"] == "Network.loadingFailed" and message["params"].get("blockedReason"):
+            blocked[message["params"].get("type", "Other")] += 1
+    if blocked:
+        saved = sum(BLOCKED_BYTES_ESTIMATE.get(kind, BLOCKED_BYTES_DEFAULT) * count for kind, count in blocked.items())
+        details = ", ".join(f"{kind} {count}" for kind, count in blocked.most_common())
+        logger.info(f"Lean navigation blocked {sum(blocked.values())} requests ({details}), ~{saved / 1024:.0f} KB saved")
+
+def build_chrome_options(user_data_dir=None):
+    """Chrome options for the configured profile (or a throwaway user_data_dir), visible or headless"""
+    options = webdriver.ChromeOptions()
+    
+    if user_data_dir:
+        # Fresh profile: skip the first-run UI and the background services a real profile needs
+        logger.info(f"Using ephemeral Chrome profile at: {user_data_dir}")
+        options.add_argument(f"--user-data-dir={user_data_dir}")
+        for flag in EPHEMERAL_PROFILE_FLAGS:
+            options.add_argument(flag)
+    else:
+        # Add Chrome profile path to maintain login sessions
+        logger.info(f"Using Chrome profile at: {CHROME_USER_DATA_DIR} - {CHROME_PROFILE}")
+        options.add_argument(f"--user-data-dir={CHROME_USER_DATA_DIR}")
+        options.add_argument(f"--profile-directory={CHROME_PROFILE}")
+    
+    # Fix for DevToolsActivePort error
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument(f"--remote-debugging-port={DEBUGGING_PORT}")
+    
+    # Auto-allow camera
+    options.add_argument("--use-fake-ui-for-media-stream")
+    if HEADLESS or FAKE_CAMERA:
+        # Synthetic camera: the stream is available immediately and needs no device
+        options.add_argument("--use-fake-device-for-media-stream")
+    if HEADLESS:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1366,900")
+    options.add_experimental_option("excludeSwitches", ["enable-logging"])
+    
+    # Disable extensions that might cause issues
+    options.add_argument("--disable-extensions")
+    
+    if LEAN_NAVIGATION:
+        # Hand control back at DOMContentLoaded; the wait engine checks what the phases need
+        options.page_load_strategy = "eager"
+        # Network events feed the "bytes saved" estimate
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+def create_driver(options):
+    """Start ChromeDriver with the resolved binary, falling back to chromedriver.exe"""
+    try:
+        # Cached driver matching the installed Chrome - no network in the common case
+        return webdriver.Chrome(service=Service(resolve_chromedriver()), options=options)
+    except SessionNotCreatedException as e:
+        # Also raised for a locked profile, a crashed Chrome or a missing DevToolsActivePort;
+        # only a version mismatch is fixed by fetching another driver
+        if not DRIVER_MISMATCH_RE.search(e.msg or ""):
+            raise
+        # Chrome updated since the driver was cached - resolve again, downloading if needed
+        logger.warning(f"Cached ChromeDriver rejected by Chrome: {e.msg}")
+        return webdriver.Chrome(service=Service(resolve_chromedriver(refresh=True)), options=options)
+    except Exception as e:
+        logger.error(f"Error resolving ChromeDriver: {e}")
+        logger.info("Trying with direct path to ChromeDriver...")
+        
+        # Try a direct approach with system ChromeDriver
+        driver_path = os.path.join(script_directory, "chromedriver.exe")
+        if os.path.exists(driver_path):
+            return webdriver.Chrome(service=Service(driver_path), options=options)
+        raise Exception("ChromeDriver not found. Please download it manually and place in script directory.")
+
+@timed_phase("driver_startup")
+def start_chrome(options=None):
+    """Cold-start Chrome on the configured profile, or on an ephemeral one with EPHEMERAL_PROFILE"""
+    session = _load_session() if EPHEMERAL_PROFILE and options is None else None
+    if EPHEMERAL_PROFILE and options is None and not session:
+        logger.warning(f"No session in {SESSION_FILE} to seed an ephemeral profile, using the full profile")
+    
+    if session:
+        # Nothing else uses the throwaway profile, so no Chrome needs killing
+        set_strategy("ephemeral profile")
+        options = build_chrome_options(user_data_dir=create_ephemeral_profile())
+    else:
+        # Kill any running Chrome instances first
+        kill_chrome_processes()
+        set_strategy("cold start")
+    
+    # Start Chrome with visible window
+    logger.info("Starting Chrome browser...")
+    driver = create_driver(options or build_chrome_options())
+    if HEADLESS:
+        logger.info("Chrome browser started successfully in headless mode")
+    else:
+        driver.maximize_window()
+        logger.info("Chrome browser started successfully in visible mode")
+    
+    # Register the detector library once; every page then has window.__kal
+    install_page_library(driver)
+    enable_lean_navigation(driver)
+    if session:
+        seed_session(driver, session)
+    return driver
+
+#######################################################
+# Warm browser daemon - keep a logged-in Chrome alive for --attach runs
+#######################################################
+DAEMON_KEEPALIVE_SECONDS = 600  # Reload the parked dashboard this often
+#######################################################
+
+def is_daemon_running(port=None):
+    """True when a Chrome DevTools endpoint answers on the debugging port"""
+    port = port or DEBUGGING_PORT
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version", timeout=1) as response:
+            return response.status == 200
+    except (OSError, ValueError):
+        return False
+
+@timed_phase("driver_startup")
+def attach_to_daemon(port=None):
+    """Attach to the warm browser through its debugging endpoint and open a fresh tab"""
+    port = port or DEBUGGING_PORT
+    logger.info(f"Attaching to warm browser on 127.0.0.1:{port}...")
+    set_strategy("attach")
+    options = webdriver.ChromeOptions()
+    options.debugger_address = f"127.0.0.1:{port}"
+    if LEAN_NAVIGATION:
+        options.page_load_strategy = "eager"
+    driver = create_driver(options)
+    driver.switch_to.new_window("tab")
+    # CDP registration is per tab, so register in the tab we just opened
+    install_page_library(driver)
+    enable_lean_navigation(driver)
+    logger.info("Attached to warm browser in a new tab")
+    return driver
+
+@timed_phase("navigation")
+def open_kalvium(driver):
+    """Navigate to Kalvium Community and wait for the page"""
+    logger.info("Navigating to Kalvium Community...")
+    driver.get(KALVIUM_URL)
+    
+    # Wait for page to load
+    loaded = wait_for(driver, "page_load", element_visible(By.TAG_NAME, "body"))
+    logger.info(f"Page loaded. Current URL: {driver.current_url}")
+    return loaded is not None
+
+def ensure_logged_in(driver):
+    """Log in with Google unless the dashboard is already showing"""
+    # Check if we need to log in (only if not already on the main page)
+    if not check_if_logged_in(driver):
+        logger.info("Not logged in. Looking for Google login button...")
+        
+        # Try to find and click "Continue with Google" button
+        google_login_successful = find_and_click_google_button(driver)
+        if not google_login_successful:
+            logger.warning("Couldn't find Google login button, continuing anyway...")
+        
+        # Wait for login completion - back on Kalvium with dashboard content
+        if wait_for(driver, "login", all_of(on_kalvium(), text_present(*DASHBOARD_TEXTS))):
+            # Fresh cookies for the fast path and the next ephemeral profile
+            export_session(driver)
+    else:
+        logger.info("Already logged in to Kalvium Community")
+
+def run_browser_daemon():
+    """Start Chrome, log in, and keep the dashboard warm until interrupted"""
+    logger.info("=========== STARTING KALVIUM BROWSER DAEMON ===========")
+    driver = start_chrome()
+    try:
+        open_kalvium(driver)
+        ensure_logged_in(driver)
+        daemon_tab = driver.current_window_handle
+        logger.info(f"Browser daemon ready on port {DEBUGGING_PORT}; run with --attach to use it")
+        while True:
+            time.sleep(DAEMON_KEEPALIVE_SECONDS)
+            setup_logging()  # Moves to a new day's log after midnight
+            # Attached runs open and close their own tabs; only touch ours
+            driver.switch_to.window(daemon_tab)
+            driver.refresh()
+            ensure_logged_in(driver)
+            logger.info("Browser daemon keep-alive refresh done")
+    except KeyboardInterrupt:
+        logger.info("Browser daemon stopping...")
+    finally:
+        driver.quit()
+        logger.info("Browser closed")
+        remove_ephemeral_profile()
+
+#######################################################
+# HTTP fast path - mark attendance with the session cookies, no browser
+#######################################################
+SESSION_FILE = os.path.join(state_directory, "session.json")
+ATTENDANCE_STATUS_PATH = "/api/attendance/today"  # GET -> {"status": "present" | "absent" | ...}
+ATTENDANCE_MARK_PATH = "/api/attendance/mark"     # POST -> {"status": "present"}
+FAST_PATH_TIMEOUT = 5
+#######################################################
+
+_http_session = None
+
+def export_session(driver, path=None):
+    """Save the Kalvium and Google auth cookies (HttpOnly included) and Kalvium's localStorage
+
+    The file feeds both the HTTP fast path and ephemeral profiles (see seed_session).
+    """
+    path = path or SESSION_FILE
+    try:
+        host = urllib.parse.urlparse(KALVIUM_URL).hostname
+        cookies = [cookie for cookie in driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+                   if _cookie_matches(cookie, host) or
+                   any(_in_domain(cookie, domain) for domain in AUTH_COOKIE_DOMAINS)]
+        session = {"exported_at": datetime.now().isoformat(timespec="seconds"), "cookies": cookies}
+        origin = driver.execute_script("return location.origin")
+        if origin == _kalvium_origin():
+            session["origin"] = origin
+            session["local_storage"] = driver.execute_script(
+                "const items = {};"
+                "for (let i = 0; i < localStorage.length; i++) {"
+                "    const key = localStorage.key(i); items[key] = localStorage.getItem(key);"
+                "}"
+                "return items;")
+        elif os.path.exists(path):
+            # Not on Kalvium right now - keep the localStorage exported last time
+            previous = _load_session(path) or {}
+            session.update({key: previous[key] for key in ("origin", "local_storage") if key in previous})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Auth cookies - readable by the owner only, from the moment the file exists
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with os.fdopen(os.open(temp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(session, f)
+        os.replace(temp_path, path)
+        logger.info(f"Exported {len(cookies)} session cookies and "
+                    f"{len(session.get('local_storage', {}))} localStorage items to {path}")
+    except Exception as e:
+        logger.warning(f"Could not export session: {e}")
+
+def _kalvium_origin():
+    parsed = urllib.parse.urlparse(KALVIUM_URL)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+def _load_session(path=None):
+    """The exported session file as a dict, or None"""
     try:
-        logger.info("Attempting to close any running Chrome instances...")
-        # For Windows
-        for proc in psutil.process_iter(['pid', 'name']):
-            # Check if process name contains chrome
-            if 'chrome' in proc.info['name'].lower():
-                logger.info(f"Killing Chrome process with PID {proc.info['pid']}")
-                try:
-                    process = psutil.Process(proc.info['pid'])
-                    process.terminate()
-                except Exception as e:
-                    logger.warning(f"Failed to kill process {proc.info['pid']}: {e}")
-        
-        # Give processes time to terminate
-        time.sleep(2)
-        logger.info("Chrome processes terminated.")
-    except Exception as e:
-        logger.error(f"Error while killing Chrome processes: {e}")
+        with open(path or SESSION_FILE) as f:
+            session = json.load(f)
+        return session if session.get("cookies") else None
+    except (OSError, ValueError, AttributeError):
+        return None
 
-def main():
-    driver = None
+def _cookie_matches(cookie, host):
+    domain = cookie["domain"].lstrip(".")
+    return host == domain or host.endswith("." + domain)
+
+def _in_domain(cookie, domain):
+    """Cookie set for domain itself or one of its subdomains (not e.g. evilgoogle.com)"""
+    cookie_domain = cookie["domain"].lstrip(".")
+    return cookie_domain == domain or cookie_domain.endswith("." + domain)
+
+def _load_session_cookies(path=None):
+    """Cookies from the exported session file, or from the warm browser daemon"""
+    session = _load_session(path)
+    if session:
+        return session["cookies"]
+    if is_daemon_running():
+        # The daemon's profile is logged in - borrow its cookies over CDP
+        driver = attach_to_daemon()
+        try:
+            return driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+        finally:
+            driver.close()
+            driver.quit()
+    return None
+
+def _get_http_session():
+    """Pooled keep-alive HTTP session shared by every fast-path request"""
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        _http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        _http_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+    return _http_session
+
+@timed_phase("fast_path")
+def mark_attendance_fast(session_file=None):
+    """Mark present over HTTP; returns 'present'/'already_present', or None to fall back to the browser"""
+    logger.info("Trying HTTP fast path...")
     try:
-        logger.info("=========== STARTING KALVIUM ATTENDANCE SCRIPT ===========")
-        
-        # Kill any running Chrome instances first
-        kill_chrome_processes()
-        
-        # Configure Chrome options for visible mode
-        options = webdriver.ChromeOptions()
+        cookies = _load_session_cookies(session_file)
+        if not cookies:
+            logger.info("Fast path: no exported session available")
+            return None
+        host = urllib.parse.urlparse(KALVIUM_URL).hostname
+        headers = {
+            "Cookie": "; ".join(f"{c['name']}={c['value']}" for c in cookies if _cookie_matches(c, host)),
+            "Accept": "application/json",
+        }
+        http = _get_http_session()
         
-        # Add Chrome profile path to maintain login sessions
-        logger.info(f"Using Chrome profile at: {CHROME_USER_DATA_DIR} - {CHROME_PROFILE}")
-        options.add_argument(f"--user-data-dir={CHROME_USER_DATA_DIR}")
-        options.add_argument(f"--profile-directory={CHROME_PROFILE}")
+        response = http.get(KALVIUM_URL + ATTENDANCE_STATUS_PATH, headers=headers, timeout=FAST_PATH_TIMEOUT)
+        if response.status_code in (401, 403):
+            logger.info("Fast path: session rejected")
+            return None
+        status = response.json().get("status") if response.ok else None
+        if status == "present":
+            logger.info("✅ Fast path: already marked as present for today")
+            return "already_present"
+        if status != "absent":
+            logger.info(f"Fast path: unexpected attendance status {response.status_code} {status!r}")
+            return None
         
-        # Fix for DevToolsActivePort error
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--remote-debugging-port=9222")
-        
-        # Auto-allow camera
-        options.add_argument("--use-fake-ui-for-media-stream")
-        options.add_experimental_option("excludeSwitches", ["enable-logging"])
+        response = http.post(KALVIUM_URL + ATTENDANCE_MARK_PATH, headers=headers, timeout=FAST_PATH_TIMEOUT)
+        if response.ok and response.json().get("status") == "present":
+            logger.info("✅ Fast path: attendance marked as present")
+            return "present"
+        logger.info(f"Fast path: mark request failed with {response.status_code}")
+        return None
+    except (requests.RequestException, ValueError, AttributeError) as e:
+        # AttributeError/ValueError: the response wasn't the JSON object we expect
+        logger.info(f"Fast path failed, falling back to the browser: {e}")
+        return None
+
+# The configuration at the top of this file, which configure_account() falls back to
+_ACCOUNT_DEFAULTS = {
+    "user_data_dir": CHROME_USER_DATA_DIR,
+    "profile": CHROME_PROFILE,
+    "greeting": USER_GREETING,
+    "debugging_port": DEBUGGING_PORT,
+    "session_file": SESSION_FILE,
+    "strategy_cache_file": STRATEGY_CACHE_FILE,
+}
+
+def configure_account(user_data_dir=None, profile=None, greeting=None, debugging_port=None,
+                      session_file=None, strategy_cache_file=None):
+    """Point this process at another account (used by fleet.py workers)
+
+    Every setting is replaced: one not given reverts to its default rather than
+    keeping the previous account's value (pool workers run several accounts).
+    """
+    global CHROME_USER_DATA_DIR, CHROME_PROFILE, USER_GREETING, DEBUGGING_PORT, SESSION_FILE, STRATEGY_CACHE_FILE
+    CHROME_USER_DATA_DIR = user_data_dir or _ACCOUNT_DEFAULTS["user_data_dir"]
+    CHROME_PROFILE = profile or _ACCOUNT_DEFAULTS["profile"]
+    USER_GREETING = greeting or _ACCOUNT_DEFAULTS["greeting"]
+    DEBUGGING_PORT = debugging_port or _ACCOUNT_DEFAULTS["debugging_port"]
+    # Cookies and learned locators belong to one account; never let another overwrite them
+    SESSION_FILE = session_file or _ACCOUNT_DEFAULTS["session_file"]
+    STRATEGY_CACHE_FILE = strategy_cache_file or _ACCOUNT_DEFAULTS["strategy_cache_file"]
+
+#######################################################
+# Ephemeral profile - a throwaway Chrome profile seeded from the session file
+#######################################################
+# Cookies for these domains are exported alongside Kalvium's, so a fresh profile can
+# finish the Google round trip without the user's everyday profile
+AUTH_COOKIE_DOMAINS = ("google.com",)
+# tmpfs where there is one, so the profile never touches the disk
+EPHEMERAL_PROFILE_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+EPHEMERAL_PROFILE_FLAGS = (
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-sync",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disk-cache-size=33554432",
+)
+# Fields of a Network.getAllCookies cookie that Network.setCookies accepts back
+COOKIE_PARAM_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+#######################################################
+
+_ephemeral_profile_dir = None
+
+def create_ephemeral_profile():
+    """Make an empty user data dir for this run; remove_ephemeral_profile() deletes it"""
+    global _ephemeral_profile_dir
+    _ephemeral_profile_dir = tempfile.mkdtemp(prefix="kalvium-profile-", dir=EPHEMERAL_PROFILE_ROOT)
+    return _ephemeral_profile_dir
+
+def remove_ephemeral_profile():
+    global _ephemeral_profile_dir
+    if _ephemeral_profile_dir:
+        shutil.rmtree(_ephemeral_profile_dir, ignore_errors=True)
+        logger.info(f"Removed ephemeral profile {_ephemeral_profile_dir}")
+        _ephemeral_profile_dir = None
+
+def seed_session(driver, session):
+    """Load the exported cookies over CDP and arrange for localStorage to be restored"""
+    now = time.time()
+    cookies = []
+    for cookie in session["cookies"]:
+        if not cookie.get("session") and 0 < cookie.get("expires", -1) < now:
+            continue  # Expired since it was exported
+        param = {field: cookie[field] for field in COOKIE_PARAM_FIELDS if field in cookie}
+        if cookie.get("session") or param.get("expires", -1) <= 0:
+            param.pop("expires", None)
+        cookies.append(param)
+    driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+    
+    items = session.get("local_storage")
+    if items and session.get("origin"):
+        # Runs before the site's own scripts; keys the site has set since are left alone
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": (
+            f"if (location.origin === {json.dumps(session['origin'])}) {{"
+            f"    const items = {json.dumps(items)};"
+            "    for (const key in items) {"
+            "        if (localStorage.getItem(key) === null) localStorage.setItem(key, items[key]);"
+            "    }"
+            "}"
+        )})
+    logger.info(f"Seeded ephemeral profile with {len(cookies)} cookies and {len(items or {})} "
+                f"localStorage items from {session.get('exported_at', 'an unknown time')}")
+
+#######################################################
+# Attendance window watch - park on the dashboard until Mark Attendance appears
+#######################################################
+WINDOW_POLL_INTERVAL = 0.25   # Seconds between probes of the page-side flag
+WINDOW_POLL_JITTER = 0.2      # +/- fraction, so probes don't beat against page timers
+WINDOW_WAIT_MAX = 1800        # Give up waiting for the window after this many seconds
+WINDOW_RECHECK_SECONDS = 15   # Re-classify this often in case the page moved on by itself
+#######################################################
+
+def wait_for_attendance_window(driver, until=None):
+    """Probe the page-side watcher until the Mark Attendance button appears.
+
+    The MutationObserver in __kal watchAttendance does the DOM work as the page
+    changes, so each probe only reads a flag. Returns 'button' as soon as the button
+    is clickable, 'moved' if the page left the dashboard (feedback dialog, logout,
+    already present) and 'timeout' after WINDOW_WAIT_MAX seconds or at `until`
+    (a datetime, e.g. when the attendance window closes), whichever comes first.
+    """
+    max_wait = WINDOW_WAIT_MAX
+    if until is not None:
+        max_wait = max(0.0, min(max_wait, (until - datetime.now()).total_seconds()))
+    logger.info(f"Waiting for the attendance window (probing every ~{WINDOW_POLL_INTERVAL}s, "
+                f"up to {max_wait:.0f}s)")
+    started = time.monotonic()
+    rechecked = started
+    while True:
+        try:
+            # Re-installs itself after a navigation, since the flag lives in the document
+            watch = kal(driver, "watchAttendance", ATTENDANCE_BUTTON_XPATH)
+            if watch["ready"]:
+                logger.info(f"Attendance window open: Mark Attendance button appeared after "
+                            f"{time.monotonic() - started:.1f}s")
+                return "button"
+        except WebDriverException as e:
+            logger.warning(f"Attendance window probe failed: {type(e).__name__}")
+        now = time.monotonic()
+        if now - started > max_wait:
+            logger.warning(f"No Mark Attendance button after {max_wait:.0f}s, giving up waiting")
+            return "timeout"
+        if now - rechecked > WINDOW_RECHECK_SECONDS:
+            rechecked = now
+            if classify_page(driver)["state"] != "dashboard":
+                return "moved"
+        time.sleep(WINDOW_POLL_INTERVAL * (1 + random.uniform(-WINDOW_POLL_JITTER, WINDOW_POLL_JITTER)))
+
+#######################################################
+# Page state machine - one classifier call decides which handler runs next
+#######################################################
+# Retry policy per page state: how many failed attempts are allowed, the backoff before
+# a retry (doubling each time, +/- jitter as a fraction), and a deadline in seconds for
+# everything spent on that state
+RETRY_POLICIES = {
+    "login_page":      {"attempts": 2, "backoff": 1.0, "jitter": 0.3, "deadline": 40},
+    "google_sign_in":  {"attempts": 1, "backoff": 0.0, "jitter": 0.0, "deadline": 20},
+    "feedback_dialog": {"attempts": 2, "backoff": 0.5, "jitter": 0.3, "deadline": 15},
+    "dashboard":       {"attempts": 3, "backoff": 1.0, "jitter": 0.3, "deadline": 45},
+    "camera":          {"attempts": 3, "backoff": 0.5, "jitter": 0.3, "deadline": 40},
+    "unknown":         {"attempts": 3, "backoff": 1.0, "jitter": 0.3, "deadline": 60},
+    "loading":         {"attempts": 2, "backoff": 1.0, "jitter": 0.3, "deadline": 60},
+}
+DEFAULT_RETRY_POLICY = {"attempts": 1, "backoff": 0.0, "jitter": 0.0, "deadline": 30}
+MAX_FLOW_STEPS = 25  # Hard stop for state cycles that never count as failures
+# States worth returning to when a retry finds the tab somewhere unexpected
+CHECKPOINT_STATES = ("login_page", "dashboard", "camera")
+# Reaching one of these after the login page means the login worked
+LOGGED_IN_STATES = ("dashboard", "feedback_dialog", "already_present")
+#######################################################
+
+def classify_page(driver):
+    """Current page state in one call: {"state", "evidence", "url"} (see __kal classify)"""
+    texts = {
+        "feedback_dialog": FEEDBACK_TEXTS,
+        "confirmation": CONFIRMATION_TEXTS,
+        "already_present": ALREADY_PRESENT_TEXTS,
+        "dashboard": (USER_GREETING,) + DASHBOARD_TEXTS,
+        "login_page": LOGIN_TEXTS,
+    }
+    lowered = {state: [phrase.lower() for phrase in phrases] for state, phrases in texts.items()}
+    return kal(driver, "classify", lowered, CAMERA_BUTTON_XPATH, PRESENT_INDICATOR_XPATH, ATTENDANCE_BUTTON_XPATH)
+
+def page_state(*leaving):
+    """Condition: the page is in a recognised state other than `leaving`; returns the state"""
+    def check(driver):
+        page = classify_page(driver)
+        return page if page["state"] not in ("loading", "unknown") + leaving else False
+    return condition(f"page state other than {', '.join(leaving)}" if leaving else "page state", check)
+
+def next_page_state(driver, phase, *leaving):
+    """Wait for the page to move on from `leaving`; on timeout, take it as it is"""
+    return wait_for(driver, phase, page_state(*leaving)) or classify_page(driver)
+
+def backoff_delay(policy, failures):
+    """Seconds to wait before retry number `failures`: doubling backoff with jitter"""
+    delay = policy["backoff"] * 2 ** (failures - 1)
+    return max(0.0, delay * (1 + random.uniform(-policy["jitter"], policy["jitter"])))
+
+def run_attendance_flow(driver, wait_for_window=False, wait_until=None):
+    """Classify the page, dispatch the one handler its state needs, repeat until done.
+
+    A handler that leaves the page in the same state has failed: it is retried in place,
+    on the same driver and tab, after its policy's backoff. A retry that finds the tab on
+    a page it doesn't recognise first returns to the last good checkpoint (the URL of
+    the last login page, dashboard or camera screen reached). With wait_for_window, a
+    dashboard without the Mark Attendance button is watched until the button appears
+    (or until wait_until) instead of being retried. Returns 'present', 'already_present', 'unverified' or 'failed'.
+    """
+    failures = collections.Counter()
+    entered = {}
+    checkpoint = None
+    clicked_present = False
+    page = next_page_state(driver, "page_load")
+    for _ in range(MAX_FLOW_STEPS):
+        state = page["state"]
+        policy = RETRY_POLICIES.get(state, DEFAULT_RETRY_POLICY)
+        logger.info(f"Page state: {state} ({page['evidence']})")
+        capture_screenshot(driver, f"state_{state}")
+        entered.setdefault(state, time.monotonic())
+        if state in CHECKPOINT_STATES:
+            # page["url"] is cut to 200 characters for the logs; resuming needs the full
+            # URL, query and OAuth state included
+            checkpoint = {"state": state, "url": driver.current_url, "shown_url": page["url"]}
         
-        # Disable extensions that might cause issues
-        options.add_argument("--disable-extensions")
+        if failures[state]:
+            spent = time.monotonic() - entered[state]
+            if failures[state] >= policy["attempts"] or spent > policy["deadline"]:
+                logger.error(f"Giving up on '{state}' after {failures[state]} failed attempts in {spent:.1f}s")
+                flush_flight_recorder(f"stuck on {state}", driver)
+                return "unverified" if clicked_present else "failed"
+            delay = min(backoff_delay(policy, failures[state]), max(0.0, policy["deadline"] - spent))
+            logger.info(f"Retrying '{state}' in place (attempt {failures[state] + 1}/{policy['attempts']}) "
+                        f"after {delay:.1f}s backoff")
+            time.sleep(delay)
         
-        # Start Chrome with visible window
-        logger.info("Starting Chrome browser...")
         try:
-            # Try with ChromeDriverManager
-            driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        except Exception as e:
-            logger.error(f"Error with ChromeDriverManager: {e}")
-            logger.info("Trying with direct path to ChromeDriver...")
-            
-            # Try a direct approach with system ChromeDriver
-            driver_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chromedriver.exe")
-            if os.path.exists(driver_path):
-                driver = webdriver.Chrome(service=Service(driver_path), options=options)
+            if state == "already_present":
+                logger.info("✅ User is already marked as present for today!")
+                return "already_present"
+            elif state == "confirmation":
+                return "present" if verify_success(driver) else "unverified"
+            elif state == "login_page":
+                if not find_and_click_google_button(driver):
+                    logger.warning("Couldn't find Google login button, continuing anyway...")
+                next_page = next_page_state(driver, "login", "login_page", "google_sign_in")
+                if next_page["state"] in LOGGED_IN_STATES:
+                    export_session(driver)
+            elif state == "google_sign_in":
+                # The profile's Google session normally completes the round trip by itself
+                next_page = next_page_state(driver, "login", "google_sign_in")
+                if next_page["state"] in LOGGED_IN_STATES:
+                    export_session(driver)
+            elif state == "feedback_dialog":
+                handle_session_feedback_improved(driver)
+                next_page = next_page_state(driver, "feedback", "feedback_dialog")
+            elif state == "dashboard" and wait_for_window and not page.get("attendanceButton") \
+                    and not failures[state]:
+                # Before the window opens: stay on this page and click the moment it appears
+                waited = wait_for_attendance_window(driver, until=wait_until)
+                if waited == "timeout":
+                    return "failed"
+                if waited == "button":
+                    entered.pop(state, None)  # The click gets the full dashboard deadline
+                    page = dict(page, attendanceButton=True)
+                    continue
+                next_page = classify_page(driver)
+            elif state == "dashboard":
+                logger.info(f"Attempt {failures[state] + 1}/{policy['attempts']} to find and click Mark Attendance button")
+                if not find_and_click_mark_attendance(driver):
+                    wait_for(driver, "settle", network_idle())
+                next_page = next_page_state(driver, "camera", "dashboard")
+            elif state == "camera":
+                if handle_camera_and_present_button_fast(driver):
+                    clicked_present = True
+                    next_page = next_page_state(driver, "present", "camera")
+                    if next_page["state"] == "camera" and verify_success(driver):
+                        return "present"
+                else:
+                    logger.error("Failed to click I'm Present button")
+                    next_page = classify_page(driver)
             else:
-                raise Exception("ChromeDriver not found. Please download it manually and place in script directory.")
-        
-        driver.maximize_window()
-        logger.info("Chrome browser started successfully in visible mode")
+                # Still loading, or a page we don't recognise - give it time, then go back
+                # to the last checkpoint instead of starting the whole run over
+                if failures[state] and checkpoint:
+                    logger.info(f"Resuming from checkpoint '{checkpoint['state']}': {checkpoint['shown_url']}")
+                    driver.get(checkpoint["url"])
+                next_page = next_page_state(driver, "page_load")
+        except WebDriverException as e:
+            # Transient driver trouble (stale element, navigation mid-call) - retry this state
+            logger.warning(f"'{state}' handler hit {type(e).__name__}: {e.msg}")
+            next_page = classify_page(driver)
         
-        # Navigate to Kalvium Community
-        logger.info("Navigating to Kalvium Community...")
-        driver.get("https://kalvium.community")
-        
-        # Wait for page to load
-        WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        logger.info(f"Page loaded. Current URL: {driver.current_url}")
-        
-        # Take a screenshot of the main page
-        screenshot_path = os.path.join(log_directory, f"main_page_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
-        
-        # Check if we need to log in (only if not already on the main page)
-        if not check_if_logged_in(driver):
-            logger.info("Not logged in. Looking for Google login button...")
-            
-            # Try to find and click "Continue with Google" button
-            google_login_successful = find_and_click_google_button(driver)
-            if not google_login_successful:
-                logger.warning("Couldn't find Google login button, continuing anyway...")
-            
-            # Wait for login completion
-            time.sleep(5)
+        if next_page["state"] == state:
+            failures[state] += 1
         else:
-            logger.info("Already logged in to Kalvium Community")
-        
-        # Handle "How was the session?" emoji feedback if it appears
+            entered.pop(next_page["state"], None)  # A fresh visit gets a fresh deadline
+            failures[next_page["state"]] = 0
+        page = next_page
+    
+    logger.error(f"No result after {MAX_FLOW_STEPS} page states, giving up")
+    flush_flight_recorder("too many steps", driver)
+    return "unverified" if clicked_present else "failed"
+
+def park_until(driver, fire_at):
+    """Log in, clear the feedback dialog and wait on the dashboard until fire_at, then reload it"""
+    ensure_logged_in(driver)
+    if classify_page(driver)["state"] == "feedback_dialog":
         handle_session_feedback_improved(driver)
+    logger.info(f"Parked on the dashboard until {fire_at.strftime('%H:%M:%S')}")
+    while True:
+        remaining = (fire_at - datetime.now()).total_seconds()
+        if remaining <= 0:
+            break
+        # Long waits still get the daemon's keep-alive reload so the session stays fresh
+        time.sleep(min(remaining, DAEMON_KEEPALIVE_SECONDS))
+        if remaining > DAEMON_KEEPALIVE_SECONDS:
+            driver.refresh()
+    logger.info("Attendance window open, reloading the dashboard")
+    driver.refresh()
+
+# When the last main() call's flow settled, before browser teardown (scheduler.py latency)
+last_run = {"run": None, "outcome": None, "flow_finished": None}
+
+def main(attach=False, fast=False, fire_at=None, wait_for_window=False, wait_until=None):
+    """Run the attendance flow; returns 'present', 'already_present', 'unverified' or 'failed'
+
+    With fire_at (a datetime), the browser is started and logged in right away but the
+    attendance flow waits on the dashboard until then (see scheduler.py). With
+    wait_for_window, a dashboard that doesn't show Mark Attendance yet is watched until
+    it does (but not past wait_until, a datetime), and the button is clicked without
+    reloading or logging in again. last_run records when the flow itself finished.
+    """
+    driver = None
+    last_run.update(run=None, outcome=None, flow_finished=None)
+    attached = False
+    try:
+        setup_logging()  # No-op unless this is a new (e.g. forked worker) process
+        logger.info("=========== STARTING KALVIUM ATTENDANCE SCRIPT ===========")
+        last_run["run"] = start_run()
+        logger.info(f"Run id: {last_run['run']}")
+        clear_flight_recorder()  # Frames from an earlier run in this process aren't this run's story
         
-        # Check if already marked as present before attempting to mark attendance
-        already_present = check_if_already_present(driver)
-        if already_present:
-            logger.info("✅ User is already marked as present for today!")
-            logger.info("Closing the browser in 5 seconds...")
-            time.sleep(5)
-            return
+        if fast:
+            outcome = mark_attendance_fast()
+            if outcome:
+                last_run.update(outcome=outcome, flow_finished=datetime.now())
+                return outcome
         
-        # Find and click Mark Attendance button (with retry)
-        attendance_successful = False
-        for attempt in range(3):  # Try up to 3 times
-            logger.info(f"Attempt {attempt+1}/3 to find and click Mark Attendance button")
-            attendance_successful = find_and_click_mark_attendance(driver)
-            if attendance_successful:
-                break
-            else:
-                logger.warning(f"Attempt {attempt+1} failed, waiting 2 seconds before retry")
-                time.sleep(2)
-                
-        if not attendance_successful:
-            logger.error("Failed to find and click Mark Attendance button after multiple attempts")
-            return
+        if attach and is_daemon_running():
+            driver = attach_to_daemon()
+            attached = True
+        else:
+            if attach:
+                logger.warning("No warm browser daemon found, cold-starting Chrome")
+            driver = start_chrome()
+        
+        open_kalvium(driver)
         
-        # Handle camera and click Present button - with improved speed
-        present_successful = handle_camera_and_present_button_fast(driver)
-        if not present_successful:
-            logger.error("Failed to click I'm Present button")
-            return
+        if fire_at:
+            park_until(driver, fire_at)
         
-        # Verify success
-        verify_success(driver)
+        # Classify the page and run only the handler its state needs, until done
+        outcome = run_attendance_flow(driver, wait_for_window=wait_for_window, wait_until=wait_until)
+        last_run.update(outcome=outcome, flow_finished=datetime.now())
+        if outcome in ("failed", "unverified"):
+            # Whatever the reason (stuck, window closed, no confirmation); a no-op if the
+            # flow already flushed
+            flush_flight_recorder(f"run {outcome}", driver)
+        if outcome == "failed":
+            return outcome
         
         logger.info("Script completed successfully!")
+        if outcome != "unverified":
+            # Refresh the cookie jar so the next --fast run can skip the browser
+            export_session(driver)
+        return outcome
         
     except Exception as e:
         logger.error(f"An error occurred: {str(e)}")
         logger.error(traceback.format_exc())
         try:
             if driver:
-                screenshot_path = os.path.join(log_directory, f"error_{datetime.now().strftime('%H%M%S')}.png")
-                driver.save_screenshot(screenshot_path)
-                logger.info(f"Saved error screenshot to {screenshot_path}")
+                screenshot_path = capture_screenshot(driver, "error")
+                logger.info(f"Queued error screenshot to {screenshot_path}")
         except:
             logger.error("Failed to save error screenshot")
+        flush_flight_recorder("exception", driver)
+        return "failed"
             
     finally:
         if driver:
-            # Keep browser open for 5 seconds to see final state
-            time.sleep(5)
-            driver.quit()
-            logger.info("Browser closed")
+            # Let in-flight requests (e.g. the attendance POST) finish before closing
+            try:
+                wait_for(driver, "settle", network_idle())
+            except Exception:
+                pass
+            log_blocked_savings(driver)
+            if attached:
+                # Leave the warm browser running; just close our tab
+                driver.close()
+                driver.quit()
+                logger.info("Closed attendance tab; warm browser left running")
+            else:
+                driver.quit()
+                logger.info("Browser closed")
+        remove_ephemeral_profile()
+        # Screenshots are written in the background; make sure they hit the disk
+        flush_screenshots()
+        try:
+            dropped, freed = artifact_store.enforce_retention()
+            if dropped:
+                logger.info(f"Artifact retention: dropped {dropped} old captures, freed {freed // 1024} KB")
+        except Exception as e:
+            logger.warning(f"Artifact retention failed: {e}")
 
+@timed_phase("handle_session_feedback_improved")
 def handle_session_feedback_improved(driver):
     """Improved function to handle the session feedback with 3 emojis"""
     logger.info("Checking for session feedback prompt (improved)...")
     
     try:
-        # Take screenshot before looking for feedback form
-        screenshot_path = os.path.join(log_directory, f"before_feedback_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
-        
-        # Check if feedback form exists
-        feedback_exists = driver.execute_script("""
-            const feedbackTexts = [
-                'how was the session',
-                'how was your session',
-                'rate the session',
-                'feedback'
-            ];
-            
-            // Look for feedback prompt
-            const elements = document.querySelectorAll('*');
-            for (const el of elements) {
-                if (el.offsetHeight === 0 || el.offsetWidth === 0) continue;
-                
-                const text = (el.innerText || el.textContent || '').toLowerCase();
-                for (const feedbackText of feedbackTexts) {
-                    if (text.includes(feedbackText)) {
-                        return "Feedback form found: " + text;
-                    }
-                }
-            }
-            
-            return false;
-        """)
-        
-        if not feedback_exists:
-            logger.info("No session feedback form detected")
-            return True
-            
-        logger.info(f"Detected session feedback: {feedback_exists}")
-        
-        # Try to select the third (last) emoji - the most positive one
-        emoji_clicked = driver.execute_script("""
-            // IMPROVED EMOJI DETECTION
-            // -------------------------
-            
-            // Function to get element's absolute position
-            function getAbsolutePosition(element) {
-                const rect = element.getBoundingClientRect();
-                return {
-                    top: rect.top + window.scrollY,
-                    left: rect.left + window.scrollX,
-                    width: rect.width,
-                    height: rect.height,
-                    bottom: rect.bottom + window.scrollY,
-                    right: rect.right + window.scrollX,
-                    area: rect.width * rect.height
-                };
-            }
-            
-            // Step 1: Find all possible emoji candidates (small clickable items in a horizontal row)
-            const allClickable = document.querySelectorAll('button, img, svg, [role="button"], div');
-            const candidates = Array.from(allClickable).filter(el => {
-                // Must be visible
-                if (el.offsetHeight === 0 || el.offsetWidth === 0) return false;
-                
-                // Typical emoji size
-                const rect = el.getBoundingClientRect();
-                return rect.width >= 20 && rect.width <= 80 && rect.height >= 20 && rect.height <= 80;
-            });
-            
-            console.log("Found " + candidates.length + " potential emoji candidates");
-            
-            // Step 2: Group candidates that appear to be in a horizontal row (similar y-position)
-            const groups = [];
-            candidates.forEach(candidate => {
-                const pos = getAbsolutePosition(candidate);
-                
-                // Find a group with similar y-position
-                let foundGroup = false;
-                for (const group of groups) {
-                    const firstItemPos = getAbsolutePosition(group[0]);
-                    // If within ~10px vertically, consider it the same row
-                    if (Math.abs(pos.top - firstItemPos.top) < 20) {
-                        group.push(candidate);
-                        foundGroup = true;
-                        break;
-                    }
-                }
-                
-                if (!foundGroup) {
-                    groups.push([candidate]);
-                }
-            });
-            
-            console.log("Found " + groups.length + " potential groups");
-            
-            // Step 3: Find groups with exactly 3 items or closest to it
-            let bestGroup = null;
-            let bestScore = 0;
-            
-            for (const group of groups) {
-                // Score based on how close to 3 items and if they're in the upper half of page
-                const pos = getAbsolutePosition(group[0]);
-                const pageCenter = window.innerHeight / 2;
-                const scoreForPosition = (pos.top < pageCenter) ? 3 : 1; // Prefer upper half
-                const scoreForCount = (group.length === 3) ? 10 : (5 - Math.abs(group.length - 3));
-                
-                const totalScore = scoreForPosition * scoreForCount;
-                
-                if (totalScore > bestScore) {
-                    bestScore = totalScore;
-                    bestGroup = group;
-                }
-            }
-            
-            if (!bestGroup || bestGroup.length === 0) {
-                console.log("Could not identify emoji group");
-                return false;
-            }
-            
-            console.log("Found best group with " + bestGroup.length + " items");
-            
-            // Sort the group horizontally (left to right)
-            bestGroup.sort((a, b) => {
-                const posA = getAbsolutePosition(a);
-                const posB = getAbsolutePosition(b);
-                return posA.left - posB.left;
-            });
-            
-            // Click the last item (3rd one if 3 items, otherwise the last one for positive)
-            const emojiToClick = bestGroup[bestGroup.length - 1]; // Last/rightmost emoji
-            emojiToClick.click();
-            
-            return "Clicked the rightmost emoji in a group of " + bestGroup.length;
-        """)
+        # Only dispatched once the page classifier has seen the dialog;
+        # try to select the third (last) emoji - the most positive one
+        emoji_clicked = kal(driver, "feedbackEmoji")
         
         if emoji_clicked:
             logger.info(f"Selected emoji: {emoji_clicked}")
-            time.sleep(1)
+            # Submit button usually appears/enables once an emoji is selected
+            wait_for(driver, "feedback", element_visible(By.XPATH, SUBMIT_BUTTON_XPATH))
         else:
             logger.warning("Failed to select emoji")
         
         # Now look for the Submit button
-        submit_clicked = driver.execute_script("""
-            // IMPROVED SUBMIT BUTTON DETECTION
-            // --------------------------------
-            
-            // First try to find submit button by text
-            const submitTexts = ['submit', 'ok', 'okay', 'done', 'confirm', 'next', 'save'];
-            const buttons = document.querySelectorAll('button, [role="button"], input[type="submit"]');
-            
-            // Try matching by text first
-            for (const button of buttons) {
-                if (button.offsetHeight === 0 || button.offsetWidth === 0) continue;
-                
-                const text = (button.innerText || button.textContent || '').toLowerCase();
-                for (const submitText of submitTexts) {
-                    if (text.includes(submitText)) {
-                        console.log("Found submit button by text:", text);
-                        button.click();
-                        return "Clicked button with text: " + text;
-                    }
-                }
-            }
-            
-            // Try looking for buttons below the emojis
-            let emojiBottom = 0;
-            let feedbackContainer = null;
-            
-            // Find the feedback container
-            document.querySelectorAll('div, section, form').forEach(container => {
-                const text = (container.innerText || container.textContent || '').toLowerCase();
-                if (text.includes('how was') || text.includes('feedback') || text.includes('rate')) {
-                    feedbackContainer = container;
-                }
-            });
-            
-            if (feedbackContainer) {
-                // Look for buttons inside the feedback container
-                const containerButtons = Array.from(feedbackContainer.querySelectorAll('button'));
-                
-                // Sort by vertical position (top to bottom)
-                containerButtons.sort((a, b) => {
-                    const rectA = a.getBoundingClientRect();
-                    const rectB = b.getBoundingClientRect();
-                    return rectA.top - rectB.top;
-                });
-                
-                // The submit button is likely the last button in the container
-                if (containerButtons.length > 0) {
-                    const lastButton = containerButtons[containerButtons.length - 1];
-                    lastButton.click();
-                    return "Clicked last button in feedback container";
-                }
-            }
-            
-            // Last resort: find the most prominent button on the page
-            const visibleButtons = Array.from(buttons).filter(b => 
-                b.offsetHeight > 0 && b.offsetWidth > 0 && 
-                window.getComputedStyle(b).display !== 'none' && 
-                window.getComputedStyle(b).visibility !== 'hidden'
-            );
-            
-            // Sort by prominence (size, styling)
-            visibleButtons.sort((a, b) => {
-                const aStyle = window.getComputedStyle(a);
-                const bStyle = window.getComputedStyle(b);
-                
-                // Score based on size, color, border, etc.
-                const aScore = 
-                    (a.offsetWidth * a.offsetHeight) +
-                    (aStyle.backgroundColor !== 'rgba(0, 0, 0, 0)' ? 1000 : 0) +
-                    (aStyle.borderWidth !== '0px' ? 500 : 0) +
-                    (aStyle.fontWeight === 'bold' ? 300 : 0);
-                    
-                const bScore = 
-                    (b.offsetWidth * b.offsetHeight) +
-                    (bStyle.backgroundColor !== 'rgba(0, 0, 0, 0)' ? 1000 : 0) +
-                    (bStyle.borderWidth !== '0px' ? 500 : 0) +
-                    (bStyle.fontWeight === 'bold' ? 300 : 0);
-                    
-                return bScore - aScore; // Higher score first
-            });
-            
-            if (visibleButtons.length > 0) {
-                visibleButtons[0].click();
-                return "Clicked most prominent button";
-            }
-            
-            return false;
-        """)
+        submit_clicked = kal(driver, "feedbackSubmit")
         
         if submit_clicked:
             logger.info(f"Clicked Submit button: {submit_clicked}")
-            time.sleep(2)
+            set_strategy("emoji + submit" if emoji_clicked else "submit only")
+            wait_for(driver, "feedback", text_absent(*FEEDBACK_TEXTS))
             return True
         else:
             logger.warning("Failed to click Submit button, continuing anyway")
@@ -429,222 +2450,53 @@ def handle_session_feedback_improved(driver):
         logger.error(traceback.format_exc())
         return False
 
+@timed_phase("check_if_logged_in")
 def check_if_logged_in(driver):
     """Check if user is already logged in to Kalvium Community"""
     logger.info("Checking if already logged in...")
     
     try:
-        # Take screenshot
-        screenshot_path = os.path.join(log_directory, f"check_login_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
-        
-        # Look for elements that indicate logged in state
-        logged_in = driver.execute_script("""
-            // Check for user greeting or profile elements
-            if (document.body.innerText.includes('Hi Dinesh')) {
-                return "Found user greeting";
-            }
-            
-            // Check for other dashboard elements
-            if (document.querySelector('[class*="dashboard"], [class*="schedule"], [class*="calendar"]')) {
-                return "Found dashboard elements";
-            }
-            
-            // Check if login button is present (negative indicator)
-            if (document.body.innerText.toLowerCase().includes('sign in') || 
-                document.body.innerText.toLowerCase().includes('login') ||
-                document.body.innerText.toLowerCase().includes('continue with google')) {
-                return false;
-            }
-            
-            // If we're on a page with "My Day" or other dashboard content
-            if (document.body.innerText.includes('My Day') || 
-                document.body.innerText.includes('Squad') ||
-                document.body.innerText.includes('Announcements')) {
-                return "Found dashboard content";
-            }
-            
-            return false;
-        """)
-        
-        if logged_in:
-            logger.info(f"User is logged in: {logged_in}")
-            return True
-        else:
-            logger.info("User is not logged in")
+        page = classify_page(driver)
+        if page["state"] in ("login_page", "google_sign_in", "loading", "unknown"):
+            logger.info(f"User is not logged in (page state: {page['state']})")
             return False
+        logger.info(f"User is logged in: {page['state']} ({page['evidence']})")
+        set_strategy(page["state"])
+        return True
             
     except Exception as e:
         logger.error(f"Error checking if logged in: {e}")
         logger.error(traceback.format_exc())
         return False
 
-def check_if_already_present(driver):
-    """Check if user is already marked as present for today"""
-    logger.info("Checking if user is already marked as present...")
-    
-    try:
-        # Wait for Kalvium page to fully load
-        time.sleep(3)
-        
-        # Take screenshot
-        screenshot_path = os.path.join(log_directory, f"checking_present_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
-        
-        # Method 1: Direct check for present indicator
-        try:
-            present_indicator = driver.find_element(By.XPATH, 
-                "//div[contains(text(), 'Present')] | " +
-                "//span[contains(text(), 'Present')] | " +
-                "//div[contains(text(), \"You're marked as present\")]")
-            
-            if present_indicator:
-                logger.info(f"Found present indicator: {present_indicator.text}")
-                return True
-        except NoSuchElementException:
-            logger.info("No present indicator found via direct method")
-        
-        # Method 2: Look for confirmation text
-        try:
-            confirmation_text = driver.find_element(By.XPATH, 
-                "//*[contains(text(), 'Yay! You') and contains(text(), 'marked as present')]")
-            
-            if confirmation_text:
-                logger.info(f"Found confirmation text: {confirmation_text.text}")
-                return True
-        except NoSuchElementException:
-            logger.info("No confirmation text found")
-        
-        # Method 3: JavaScript check for presence-related elements
-        already_present = driver.execute_script("""
-            // Check for various indicators that user is already present
-            const presentTexts = [
-                'present', 
-                'marked as present', 
-                'already marked', 
-                'stay focussed',
-                'you\'re marked',
-                'yay!'
-            ];
-            
-            // Look through visible elements for present indicator texts
-            const elements = document.querySelectorAll('*');
-            for (const el of elements) {
-                if (el.offsetHeight === 0 || el.offsetWidth === 0) continue; // Skip hidden elements
-                
-                const text = (el.innerText || el.textContent || '').toLowerCase();
-                for (const presentText of presentTexts) {
-                    if (text.includes(presentText)) {
-                        return "Already present indicator found: " + text;
-                    }
-                }
-            }
-            
-            return false;
-        """)
-        
-        if already_present:
-            logger.info(f"JavaScript found already present indicator: {already_present}")
-            return True
-        
-        logger.info("User is not marked as present yet")
-        return False
-            
-    except Exception as e:
-        logger.error(f"Error checking if already present: {e}")
-        logger.error(traceback.format_exc())
-        return False
-
+@timed_phase("find_and_click_google_button")
 def find_and_click_google_button(driver):
     """Find and click the Continue with Google button"""
     logger.info("Looking for 'Continue with Google' button...")
     
     try:
-        # Take a screenshot before looking for the Google button
-        screenshot_path = os.path.join(log_directory, f"before_google_button_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
-        
-        # Try several different approaches to find the Google button
-        
-        # Approach 1: Direct link or button text
-        try:
-            google_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Google')]"))
-            )
-            google_button.click()
-            logger.info("Clicked Google button using approach 1")
-            time.sleep(2)
-            return True
-        except (TimeoutException, NoSuchElementException):
-            logger.info("Approach 1 failed to find Google button")
-        
-        # Approach 2: Look for Google icon within a button
-        try:
-            google_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "button img[alt*='Google'], button img[src*='google']"))
-            )
-            google_button.click()
-            logger.info("Clicked Google button using approach 2")
-            time.sleep(2)
-            return True
-        except (TimeoutException, NoSuchElementException):
-            logger.info("Approach 2 failed to find Google button")
+        current_url = driver.current_url
         
-        # Approach 3: Using JavaScript to find and click any element related to Google login
-        google_clicked = driver.execute_script("""
-            // Try to find the Google button
-            const buttons = Array.from(document.querySelectorAll('button, a, div[role="button"]'));
-            
-            // First look for buttons containing "Google" text
-            for (const btn of buttons) {
-                const text = (btn.innerText || btn.textContent || '').toLowerCase();
-                if (text.includes('google')) {
-                    console.log('Found Google button by text:', text);
-                    btn.click();
-                    return "Clicked Google button by text";
-                }
-            }
-            
-            // Then look for buttons with Google images
-            for (const btn of buttons) {
-                const images = btn.querySelectorAll('img');
-                for (const img of images) {
-                    const src = img.src || '';
-                    const alt = img.alt || '';
-                    if (src.includes('google') || alt.includes('google')) {
-                        console.log('Found Google button by image');
-                        btn.click();
-                        return "Clicked Google button by image";
-                    }
-                }
-            }
-            
-            // Look for any OAuth or SSO provider buttons
-            for (const btn of buttons) {
-                if (btn.className.includes('oauth') || 
-                    btn.className.includes('provider') || 
-                    btn.className.includes('social') ||
-                    btn.id.includes('google') ||
-                    btn.getAttribute('data-provider') === 'google') {
-                    console.log('Found Google button by class/attribute');
-                    btn.click();
-                    return "Clicked Google button by class/attribute";
-                }
-            }
-            
-            return false;
-        """)
+        # Approach 1: direct button text, 2: Google icon within a button,
+        # 3: JavaScript search for any element related to Google login.
+        # All three are checked together on every poll; the first to match is clicked
+        match = run_strategies(driver, "google_button", "Google button", [
+            ("approach 1", By.XPATH, GOOGLE_BUTTON_XPATH),
+            ("approach 2", By.CSS_SELECTOR, GOOGLE_ICON_CSS),
+            ("approach 3", "detector", "googleButton"),
+        ], expected_text="google", wait_phase="google_button",
+           verify=(url_changes(current_url),), verify_phase="login_redirect")
+        if match:
+            if match["name"] == "approach 3":
+                logger.info(f"JavaScript approach succeeded: {match['result']}")
+            else:
+                logger.info(f"Clicked Google button using {match['name']}")
+            return match["verified"]
         
-        if google_clicked:
-            logger.info(f"JavaScript approach succeeded: {google_clicked}")
-            time.sleep(3)
-            return True
-        else:
-            logger.warning("All approaches failed to find Google button")
+        logger.warning("All approaches failed to find Google button")
             
         # Take another screenshot to see the page state
-        screenshot_path = os.path.join(log_directory, f"after_google_button_search_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
+        capture_screenshot(driver, "after_google_button_search")
         
         return False
             
@@ -652,114 +2504,28 @@ def find_and_click_google_button(driver):
         logger.error(f"Error finding Google button: {e}")
         return False
 
+@timed_phase("find_and_click_mark_attendance")
 def find_and_click_mark_attendance(driver):
     """Find and click the Mark Attendance button"""
     logger.info("Looking for 'Mark Attendance' button...")
     
     try:
-        # Wait for Kalvium page to fully load
-        WebDriverWait(driver, 30).until(
-            lambda d: "kalvium" in d.current_url.lower()
-        )
-        logger.info(f"Current URL: {driver.current_url}")
-        
-        # Take screenshot of the main page
-        screenshot_path = os.path.join(log_directory, f"main_page_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
-        
-        # Wait additional time for any JavaScript to load
-        time.sleep(3)
-        
-        # Try direct approach first
-        try:
-            attendance_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, 
-                    "//button[contains(text(), 'Attendance') or contains(text(), 'attendance')] | " +
-                    "//a[contains(text(), 'Attendance') or contains(text(), 'attendance')] | " +
-                    "//button[contains(text(), 'Mark') or contains(text(), 'mark')] | " +
-                    "//a[contains(text(), 'Mark') or contains(text(), 'mark')]"
-                ))
-            )
-            
-            logger.info(f"Found attendance button: {attendance_button.text}")
-            attendance_button.click()
-            logger.info("Clicked attendance button")
-            time.sleep(2)
-            return True
-        except (TimeoutException, NoSuchElementException) as e:
-            logger.warning(f"Direct approach for finding attendance button failed: {e}")
-        
-        # JavaScript approach as fallback
-        logger.info("Trying JavaScript approach for attendance button")
-        attendance_clicked = driver.execute_script("""
-            // Look for any element with attendance text
-            const allElements = document.querySelectorAll('*');
-            for (const elem of allElements) {
-                const text = (elem.innerText || elem.textContent || '').toLowerCase();
-                if (text.includes('attendance') || text.includes('mark attendance')) {
-                    console.log('Found element with attendance text:', elem.tagName, text);
-                    
-                    // If it's directly clickable
-                    if (elem.tagName === 'BUTTON' || elem.tagName === 'A' || 
-                        elem.role === 'button' || elem.getAttribute('role') === 'button') {
-                        elem.click();
-                        return "Clicked direct element: " + elem.tagName + " - " + text;
-                    }
-                    
-                    // Check parents for clickable elements
-                    let parent = elem.parentElement;
-                    let level = 0;
-                    while (parent && level < 5) {
-                        if (parent.tagName === 'BUTTON' || parent.tagName === 'A' || 
-                            parent.onclick || parent.role === 'button' || 
-                            parent.getAttribute('role') === 'button' ||
-                            window.getComputedStyle(parent).cursor === 'pointer') {
-                            parent.click();
-                            return "Clicked parent: " + parent.tagName + " - level " + level;
-                        }
-                        parent = parent.parentElement;
-                        level++;
-                    }
-                    
-                    // Check children for clickable elements
-                    const clickableChildren = elem.querySelectorAll('button, a, [role="button"]');
-                    if (clickableChildren.length > 0) {
-                        clickableChildren[0].click();
-                        return "Clicked child: " + clickableChildren[0].tagName;
-                    }
-                    
-                    // Force click as last resort
-                    try {
-                        elem.click();
-                        return "Force-clicked: " + elem.tagName + " - " + text;
-                    } catch (e) {
-                        console.log("Failed to click:", e);
-                    }
-                }
-            }
-            
-            // Last resort - look for prominent buttons
-            const prominentButtons = Array.from(document.querySelectorAll('button')).filter(b => 
-                b.offsetHeight > 0 && b.offsetWidth > 0 && (
-                    b.className.includes('primary') || 
-                    b.className.includes('action') ||
-                    b.offsetWidth > 150 ||
-                    b.style.fontSize > '16px'
-                )
-            );
-            
-            if (prominentButtons.length > 0) {
-                prominentButtons[0].click();
-                return "Clicked prominent button: " + (prominentButtons[0].innerText || prominentButtons[0].textContent);
-            }
-            
-            return false;
-        """)
+        # Wait for the button to render, or for the page to settle without it
+        wait_for(driver, "attendance_button",
+                 element_visible(By.XPATH, ATTENDANCE_BUTTON_XPATH), network_idle())
         
-        if attendance_clicked:
-            logger.info(f"JavaScript found and clicked attendance button: {attendance_clicked}")
-            time.sleep(2)
-            return True
+        # Direct XPath and the JavaScript fallback race; the first to match is clicked
+        match = run_strategies(driver, "mark_attendance", "attendance button", [
+            ("direct XPath", By.XPATH, ATTENDANCE_BUTTON_XPATH),
+            ("JavaScript fallback", "detector", "attendanceButton"),
+        ], expected_text="attendance", wait_phase="attendance_click",
+           verify=CAMERA_SCREEN_CONDITIONS, verify_phase="camera")
+        if match:
+            if match["name"] == "JavaScript fallback":
+                logger.info(f"JavaScript found and clicked attendance button: {match['result']}")
+            else:
+                logger.info(f"Clicked attendance button using {match['name']}")
+            return match["verified"]
         else:
             logger.error("Could not find 'Mark Attendance' button")
             return False
@@ -769,180 +2535,68 @@ def find_and_click_mark_attendance(driver):
         logger.error(traceback.format_exc())
         return False
 
+def wait_for_camera(driver):
+    """Await camera readiness in the page (event-driven, no polling); returns what was ready"""
+    timeout = PHASE_DEADLINES["camera"]
+    started = time.monotonic()
+    try:
+        state = kal_async(driver, "cameraReady", int(timeout * 1000), CAMERA_BUTTON_XPATH)
+    except WebDriverException as e:
+        # Page navigated mid-wait or async scripts are unavailable - fall back to polling
+        logger.info(f"[camera] Async readiness check failed ({e.msg}), polling instead")
+        return wait_for(driver, "camera", *CAMERA_SCREEN_CONDITIONS)
+    elapsed = time.monotonic() - started
+    if state:
+        logger.info(f"[camera] Ready after {elapsed:.2f}s: {state}")
+    else:
+        logger.warning(f"[camera] Gave up after {elapsed:.2f}s waiting for the camera or Present button")
+    return state
+
+@timed_phase("handle_camera_and_present_button_fast")
 def handle_camera_and_present_button_fast(driver):
     """Handle camera activation and clicking the I'm Present button with improved speed"""
     logger.info("Waiting for camera to initialize (fast mode)...")
     
     try:
-        # Reduced wait time for camera initialization
-        time.sleep(5)
-        
-        # Take camera screen screenshot
-        screenshot_path = os.path.join(log_directory, f"camera_screen_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
-        
-        # Aggressive JavaScript approach to immediately find and click the Present button
-        present_clicked = driver.execute_script("""
-            // Aggressive Present Button finder and clicker
-            function findAndClickPresentButton() {
-                // Direct button text search
-                const buttons = document.querySelectorAll('button');
-                for (const button of buttons) {
-                    const text = (button.innerText || button.textContent || '').toLowerCase();
-                    if (text.includes('present') || text.includes("i'm present") || 
-                        text.includes('confirm') || text.includes('submit')) {
-                        button.click();
-                        return "Clicked button: " + text;
-                    }
-                }
-                
-                // Visible buttons
-                const visibleButtons = Array.from(buttons).filter(b => 
-                    b.offsetHeight > 0 && b.offsetWidth > 0 && 
-                    window.getComputedStyle(b).display !== 'none' && 
-                    window.getComputedStyle(b).visibility !== 'hidden'
-                );
-                
-                // Primary/action buttons
-                for (const button of visibleButtons) {
-                    if (button.className.toLowerCase().includes('primary') || 
-                        button.className.toLowerCase().includes('action') ||
-                        button.className.toLowerCase().includes('submit') ||
-                        button.className.toLowerCase().includes('confirm') ||
-                        window.getComputedStyle(button).backgroundColor !== 'rgba(0, 0, 0, 0)') {
-                        button.click();
-                        return "Clicked primary style button: " + button.className;
-                    }
-                }
-                
-                // Last resort - click the largest visible button
-                if (visibleButtons.length > 0) {
-                    visibleButtons.sort((a, b) => 
-                        (b.offsetWidth * b.offsetHeight) - (a.offsetWidth * a.offsetHeight)
-                    );
-                    visibleButtons[0].click();
-                    return "Clicked largest button";
-                }
-                
-                return false;
-            }
-            
-            // Try immediately
-            let result = findAndClickPresentButton();
-            if (result) return result;
-            
-            // Set up repeated attempts to find and click the button
-            let attempts = 0;
-            const intervalId = setInterval(() => {
-                attempts++;
-                console.log("Attempt", attempts, "to find Present button");
-                const result = findAndClickPresentButton();
-                if (result || attempts >= 15) {
-                    clearInterval(intervalId);
-                    if (result) return result;
-                }
-            }, 500);
-            
-            // Return that we've set up the attempts
-            return "Set up repeated attempts to find Present button";
-        """)
-        
-        logger.info(f"Started aggressive Present button detection: {present_clicked}")
-        
-        # Wait for a short time to give the JavaScript time to work
-        time.sleep(3)
-        
-        # Try conventional approach as backup
-        try:
-            present_button = WebDriverWait(driver, 3).until(
-                EC.element_to_be_clickable((By.XPATH, 
-                    "//button[contains(text(), 'Present') or contains(text(), 'present')] | " +
-                    "//button[contains(text(), \"I'm\") and contains(text(), 'Present')] | " +
-                    "//button[contains(text(), 'Confirm') or contains(text(), 'confirm')] | " +
-                    "//button[contains(text(), 'Submit') or contains(text(), 'submit')]"
-                ))
-            )
-            
-            logger.info(f"Found Present button: {present_button.text}")
-            present_button.click()
-            logger.info("Clicked Present button")
-            return True
-        except (TimeoutException, NoSuchElementException) as e:
-            logger.info(f"Conventional approach didn't find button: {e}")
-            
-        # Check if JavaScript approach was successful
-        success_check = driver.execute_script("""
-            // Check if we are now on a result/success page
-            const successIndicators = [
-                'success',
-                'thank you',
-                'marked as present',
-                'attendance confirmed'
-            ];
-            
-            const pageText = document.body.innerText.toLowerCase();
-            for (const indicator of successIndicators) {
-                if (pageText.includes(indicator)) {
-                    return "Success page detected: " + indicator;
-                }
-            }
-            
-            // Try clicking the button again - one last attempt
-            const buttons = document.querySelectorAll('button');
-            for (const button of buttons) {
-                const text = (button.innerText || button.textContent || '').toLowerCase();
-                if (text.includes('present') || text.includes("i'm present") || 
-                    text.includes('confirm') || text.includes('submit')) {
-                    button.click();
-                    return "Clicked button in final attempt: " + text;
-                }
-            }
-            
-            return false;
-        """)
+        # Wait for real readiness: the camera stream is granted, the video has enough
+        # data, or the Present button is already clickable - whichever comes first
+        wait_for_camera(driver)
         
-        if success_check:
-            logger.info(f"Button clicking appears successful: {success_check}")
-            return True
-        else:
+        # The conventional XPath and the aggressive JavaScript detector race on every poll;
+        # a success message showing up first means an earlier click already went through
+        match = run_strategies(driver, "present_button", "Present button", [
+            ("conventional XPath", By.XPATH, PRESENT_BUTTON_XPATH),
+            ("JavaScript retries", "detector", "presentButton"),
+        ], expected_text="present", wait_phase="present",
+           verify=(text_present(*SUCCESS_TEXTS),), verify_phase="present", done_texts=SUCCESS_TEXTS)
+        if not match:
             logger.warning("Could not verify if Present button was clicked")
             return False
+        if match["name"] == "JavaScript retries":
+            logger.info(f"Button clicking appears successful: {match['result']}")
+        elif match["name"] != "done":
+            logger.info(f"Clicked Present button using {match['name']}")
+        return True
             
     except Exception as e:
         logger.error(f"Error handling Present button: {e}")
         logger.error(traceback.format_exc())
         return False
 
+@timed_phase("verify_success")
 def verify_success(driver):
     """Verify if attendance was successfully marked"""
     logger.info("Verifying success...")
     
     try:
         # Take final screenshot
-        screenshot_path = os.path.join(log_directory, f"final_screen_{datetime.now().strftime('%H%M%S')}.png")
-        driver.save_screenshot(screenshot_path)
+        capture_screenshot(driver, "final_screen")
         
         # Check for success indicators
-        success_found = driver.execute_script("""
-            const successTexts = ['success', 'present', 'marked', 'attendance', 'thank', 'confirmed', 'yay'];
-            const elements = document.querySelectorAll('*');
-            
-            for (const el of elements) {
-                if (el.offsetHeight === 0 || el.offsetWidth === 0) continue; // Skip hidden elements
-                
-                const text = (el.innerText || el.textContent || '').toLowerCase();
-                for (const successText of successTexts) {
-                    if (text.includes(successText)) {
-                        return "Success indicator found: " + text;
-                    }
-                }
-            }
-            
-            return false;
-        """)
+        success_found = first_visible_text(driver, CONFIRMATION_TEXTS + SUCCESS_TEXTS)
         
         if success_found:
-            logger.info(f"✅ Success verification: {success_found}")
+            logger.info(f"✅ Success verification: '{success_found[0]}' in \"{success_found[1]}\"")
             logger.info("✅ Attendance successfully marked!")
             return True
         else:
@@ -956,4 +2610,27 @@ def verify_success(driver):
         return False
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Mark attendance on Kalvium Community")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep a warm, logged-in Chrome running for --attach runs")
+    parser.add_argument("--attach", action="store_true",
+                        help="attach to the warm browser daemon instead of starting Chrome")
+    parser.add_argument("--fast", action="store_true",
+                        help="try marking attendance over HTTP with the exported session first")
+    parser.add_argument("--headless", action="store_true",
+                        help="run Chrome without a window, with a synthetic camera")
+    parser.add_argument("--fake-camera", action="store_true",
+                        help="use Chrome's synthetic camera instead of the webcam")
+    parser.add_argument("--ephemeral", action="store_true",
+                        help="start Chrome on a throwaway profile seeded from state/session.json")
+    parser.add_argument("--wait-for-window", action="store_true",
+                        help="stay on the dashboard until the Mark Attendance button appears")
+    args = parser.parse_args()
+    HEADLESS = HEADLESS or args.headless
+    FAKE_CAMERA = FAKE_CAMERA or args.fake_camera
+    EPHEMERAL_PROFILE = EPHEMERAL_PROFILE or args.ephemeral
+    
+    if args.daemon:
+        run_browser_daemon()
+    else:
+        main(attach=args.attach, fast=args.fast, wait_for_window=args.wait_for_window)